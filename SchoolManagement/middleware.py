@@ -1,5 +1,15 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
 from django.http import HttpResponseBadRequest
 
+logger = logging.getLogger(__name__)
+
 _CORRUPTED_CHARS = ('�', '\x00')
 
 
@@ -11,3 +21,115 @@ class RejectCorruptedPathMiddleware:
         if any(c in request.path for c in _CORRUPTED_CHARS):
             return HttpResponseBadRequest()
         return self.get_response(request)
+
+
+class SeriesHorizonMiddleware:
+    """
+    Prolonge l'horizon des séries sans date de fin à la première requête de la
+    journée (dashboard.services.ensure_series_horizons), sans tâche planifiée.
+    Placé avant QueryBudgetMiddleware : ces requêtes ne comptent pas dans le
+    budget de la vue.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if getattr(settings, 'SERIES_HORIZON_ON_REQUEST', True):
+            from dashboard.services import ensure_series_horizons
+            ensure_series_horizons()
+        return self.get_response(request)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+# Listes de paramètres "IN (%s, %s, ...)" ramenées à une seule forme
+_IN_PARAMS = re.compile(r'\((?:%s|\?)(?:\s*,\s*(?:%s|\?))*\)')
+
+
+class _QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[_IN_PARAMS.sub('(...)', sql)] += 1
+
+
+class QueryBudgetMiddleware:
+    """
+    Compte les requêtes SQL et le temps base de données de chaque requête HTTP.
+    - Server-Timing (si QUERY_BUDGET_SERVER_TIMING) : db;dur=<ms>;desc="<n> queries"
+    - N+1 : une même forme de requête répétée QUERY_BUDGET_NPLUSONE_THRESHOLD fois est loguée
+    - QUERY_BUDGETS {url_name: max} : dépassement logué, ou QueryBudgetExceeded
+      si QUERY_BUDGET_RAISE (activé pendant les tests).
+    Réponses en streaming : les requêtes exécutées pendant l'envoi du contenu
+    sont aussi comptées, et les contrôles ont lieu à la fin du flux ; l'en-tête
+    Server-Timing, parti avant le corps, ne couvre que la vue.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = _QueryRecorder()
+        with self._recording(recorder):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match else None
+        if response.streaming:
+            response.streaming_content = self._recorded_stream(
+                response.streaming_content, recorder, url_name, request
+            )
+        else:
+            self._check(recorder, url_name, request)
+
+        if getattr(settings, 'QUERY_BUDGET_SERVER_TIMING', False):
+            response['Server-Timing'] = (
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"'
+            )
+        return response
+
+    @staticmethod
+    def _recording(recorder):
+        stack = ExitStack()
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(recorder))
+        return stack
+
+    def _recorded_stream(self, content, recorder, url_name, request):
+        with self._recording(recorder):
+            yield from content
+        self._check(recorder, url_name, request)
+
+    def _check(self, recorder, url_name, request):
+        self._check_repeated_shapes(recorder, url_name, request)
+        self._check_budget(recorder, url_name)
+
+    def _check_repeated_shapes(self, recorder, url_name, request):
+        threshold = getattr(settings, 'QUERY_BUDGET_NPLUSONE_THRESHOLD', 10)
+        for shape, repeats in recorder.shapes.items():
+            if repeats >= threshold:
+                logger.warning(
+                    "N+1 probable sur %s (%s) : %d× %s",
+                    url_name or request.path, request.path, repeats, shape,
+                )
+
+    def _check_budget(self, recorder, url_name):
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(url_name)
+        if budget is None or recorder.count <= budget:
+            return
+        message = f"{url_name} : {recorder.count} requêtes SQL (budget {budget})"
+        if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -1,4 +1,5 @@
 from pathlib import Path
+import sys
 import dj_database_url
 from datetime import datetime
 from dotenv import load_dotenv
@@ -127,6 +128,8 @@ SITE_ID = 1
 
 MIDDLEWARE = [
     "SchoolManagement.middleware.RejectCorruptedPathMiddleware",
+    "SchoolManagement.middleware.SeriesHorizonMiddleware",
+    "SchoolManagement.middleware.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -139,6 +142,51 @@ MIDDLEWARE = [
     "allauth.account.middleware.AccountMiddleware",
 ]
 
+# Budget de requêtes SQL par vue (SchoolManagement.middleware.QueryBudgetMiddleware)
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+QUERY_BUDGETS = {
+    "dashboard_home": 25,
+    "dashboard_view": 25,
+    "teacher_view": 25,
+    "admin_dashboard": 40,
+    "api_sessions_feed": 10,
+    "admin_reporting_list": 12,
+    "admin_reporting_detail": 15,
+    "teacher_reporting": 15,
+    "requests_view": 10,
+}
+QUERY_BUDGET_NPLUSONE_THRESHOLD = 10
+QUERY_BUDGET_RAISE = TESTING
+QUERY_BUDGET_SERVER_TIMING = DEBUG
+
+# Cache partagé entre les workers gunicorn (jetons de version du reporting,
+# compteurs de notifications) : table créée par "manage.py createcachetable"
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "dashboard_cache",
+    }
+}
+if TESTING:
+    # Un seul processus ; les tests de nombre de requêtes ne comptent pas le cache
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Durée de vie (secondes) des agrégats de reporting en cache, invalidés par version
+REPORTING_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Séries sans date de fin : séances créées N semaines à l'avance, horizon prolongé
+# à la première requête du jour (SeriesHorizonMiddleware) ou par extend_series_horizon
+SERIES_MATERIALIZATION_WEEKS = 8
+# Désactivé en test : les tests fixent eux-mêmes la date du jour
+SERIES_HORIZON_ON_REQUEST = not TESTING
+
+# Durée de vie (secondes) du compteur de non-lues en cache : borne l'écart après
+# une écriture groupée qui ne passe pas par dashboard.notifications
+NOTIFICATIONS_UNREAD_CACHE_TIMEOUT = 60 * 5
+
+# Les notifications lues plus anciennes (jours) sont archivées (commande archive_notifications)
+NOTIFICATIONS_RETENTION_DAYS = 90
+
 if DEBUG:
     INSTALLED_APPS += ["django_browser_reload"]
     MIDDLEWARE += ["django_browser_reload.middleware.BrowserReloadMiddleware"]
@@ -1,9 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from .notifications import invalidate_unread
 from .models import (
     CustomUser, Student, Teacher,
     Resource, Request, Language, Session, Payment, Certificate,
-    Evaluation, Notification, Comment, Profile, PaiementFormateur
+    Evaluation, Notification, Comment, Profile, PaiementFormateur, MonthlyRollup,
+    ArchivedNotification,
 )
 
 
@@ -124,6 +126,17 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter = ('notification_type', 'is_read', 'created_at')
     search_fields = ('user__username', 'title', 'message')
 
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        invalidate_unread(user_ids)
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'notification_type', 'title', 'created_at', 'archived_at')
+    list_filter = ('notification_type', 'created_at')
+    search_fields = ('user__username', 'title', 'message')
+
 @admin.register(Resource)
 class ResourceAdmin(admin.ModelAdmin):
     list_display = ('teachers', 'title', 'resource_type', 'created_at')
@@ -160,3 +173,9 @@ class PaiementFormateurAdmin(admin.ModelAdmin):
             "fields": ("montant", "montant_calcule", "statut", "date_paiement", "commentaire"),
         }),
     )
+
+
+@admin.register(MonthlyRollup)
+class MonthlyRollupAdmin(admin.ModelAdmin):
+    list_display = ('month', 'sessions_completed', 'sessions_scheduled', 'revenue', 'new_students', 'teacher_payouts', 'updated_at')
+    readonly_fields = ('updated_at',)
@@ -1,12 +1,18 @@
+import hashlib
+import itertools
 import json
 from datetime import datetime, date
-from django.http import JsonResponse
-from django.views.decorators.http import require_GET, require_POST
+from django.db.models import Aggregate, CharField, Count, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Concat
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.contrib.auth.decorators import login_required
+from django.core.serializers.json import DjangoJSONEncoder
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
 
-from .models import Session, Student, Teacher, Language, Notification
+from .models import Session, SessionSeries
+from .services import virtual_series_occurrences
+from .notifications import apply_bulk_action, unread_count
 from .forms import SessionForm
 
 
@@ -19,42 +25,83 @@ STATUS_COLORS = {
 }
 
 
-def _session_to_event(session, role='admin'):
-    start_dt = datetime.combine(session.date, session.start_time)
-    end_dt = datetime.combine(session.date, session.end_time)
-    student_names = ', '.join(
-        s.user.get_full_name() for s in session.students.select_related('user').all()
-    )
-    teacher_name = session.teacher.user.get_full_name() if session.teacher else '—'
-    lang = str(session.language)
+STATUS_LABELS = dict(Session.STATUS_CHOICES)
+
+# Relations lues par _session_to_event : doivent être chargées à l'avance
+EVENT_SELECT_RELATED = ('teacher__user', 'language')
+EVENT_PREFETCH_RELATED = ('students__user',)
+
+
+def _event(row, role='admin'):
+    """Événement FullCalendar à partir d'un dict de champs (séance ou projection values())."""
+    start_dt = datetime.combine(row['date'], row['start_time'])
+    end_dt = datetime.combine(row['date'], row['end_time'])
+    students = row['students']
+    student_names = ', '.join(students)
+    teacher_name = row['teacher_name'] or '—'
+    lang = row['language']
     if role == 'teacher':
         title = f"{lang} · {student_names or '—'}"
     elif role == 'student':
         title = f"{lang} · {teacher_name}"
     else:  # admin
         title = f"{lang} · {teacher_name} · {student_names or '—'}"
-    return {
-        'id': session.id,
+    event = {
+        'id': row['id'],
         'title': title,
         'start': start_dt.isoformat(),
         'end': end_dt.isoformat(),
-        'color': session.event_color if session.event_color else STATUS_COLORS.get(session.status, '#6b7280'),
+        'color': row['event_color'] or STATUS_COLORS.get(row['status'], '#6b7280'),
         'extendedProps': {
-            'status': session.status,
-            'status_display': session.get_status_display(),
+            'status': row['status'],
+            'status_display': STATUS_LABELS.get(row['status'], row['status']),
             'teacher': teacher_name,
             'language': lang,
-            'students': [s.user.get_full_name() for s in session.students.all()],
-            'session_id': session.id,
-            'fiche_completee': session.fiche_completee,
-            'seance_realisee': session.seance_realisee,
+            'students': students,
+            'session_id': row['id'],
+            'fiche_completee': row['fiche_completee'],
+            'seance_realisee': row['seance_realisee'],
         },
     }
+    if row.get('virtual'):
+        # Occurrence de série pas encore créée en base : affichée, non modifiable
+        event['editable'] = False
+        event['extendedProps'].update(session_id=None, virtual=True, series_id=row['series_id'])
+    return event
+
+
+def _session_to_event(session, role='admin'):
+    """
+    Sérialise une séance pour FullCalendar à partir des seules données déjà
+    chargées (EVENT_SELECT_RELATED / EVENT_PREFETCH_RELATED) : aucune requête
+    par événement.
+    """
+    return _event({
+        'id': session.id,
+        'date': session.date,
+        'start_time': session.start_time,
+        'end_time': session.end_time,
+        'status': session.status,
+        'event_color': session.event_color,
+        'fiche_completee': session.fiche_completee,
+        'seance_realisee': session.seance_realisee,
+        'teacher_name': session.teacher.user.get_full_name() if session.teacher else '',
+        'language': str(session.language),
+        'students': [s.user.get_full_name() for s in session.students.all()],
+    }, role=role)
+
+
+def _single_event(session, role='admin'):
+    """Événement d'une séance isolée (création / mise à jour) : charge ses relations en lot."""
+    session = Session.objects.select_related(*EVENT_SELECT_RELATED).prefetch_related(
+        *EVENT_PREFETCH_RELATED
+    ).get(pk=session.pk)
+    return _session_to_event(session, role=role)
 
 
 def _base_queryset(request):
     role = request.user.role
-    qs = Session.objects.select_related('teacher__user', 'language').prefetch_related('students__user')
+    qs = Session.objects.all()
     if role == 'teacher':
         qs = qs.filter(teacher=request.user.teacher)
     elif role == 'student':
@@ -62,10 +109,69 @@ def _base_queryset(request):
     return qs
 
 
-@login_required
-@require_GET
-def api_sessions_feed(request):
-    """FullCalendar feed — GET /api/sessions/?start=...&end=..."""
+# Séparateur des noms agrégés en SQL (caractère "unit separator", absent des noms)
+_NAME_SEP = '\x1f'
+
+
+class _NameList(Aggregate):
+    """Concatène des noms en SQL : GROUP_CONCAT (SQLite) / STRING_AGG (PostgreSQL)."""
+    function = 'GROUP_CONCAT'
+    output_field = CharField()
+
+    def __init__(self, expression, **extra):
+        super().__init__(expression, Value(_NAME_SEP), **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='STRING_AGG', **extra_context)
+
+
+# Colonnes lues par le flux : ni les champs pédagogiques (TextField) ni les objets liés
+FEED_FIELDS = (
+    'id', 'date', 'start_time', 'end_time', 'status', 'event_color',
+    'fiche_completee', 'seance_realisee',
+    'teacher__user__first_name', 'teacher__user__last_name', 'language__name',
+)
+
+
+def _feed_rows(qs):
+    """
+    Projection values() du flux : une seule requête, noms des étudiants
+    agrégés par une sous-requête corrélée, lecture par lots via iterator().
+    """
+    through = Session.students.through
+    student_names = (
+        through.objects.filter(session_id=OuterRef('pk'))
+        .values('session_id')
+        .annotate(names=_NameList(Concat(
+            'student__user__first_name', Value(' '), 'student__user__last_name',
+            output_field=CharField(),
+        )))
+        .values('names')
+    )
+    rows = (
+        qs.order_by('date', 'start_time', 'id')
+        .annotate(student_names=Subquery(student_names))
+        .values(*FEED_FIELDS, 'student_names')
+    )
+    for row in rows.iterator(chunk_size=500):
+        names = row['student_names']
+        yield {
+            **row,
+            'teacher_name': f"{row['teacher__user__first_name']} {row['teacher__user__last_name']}".strip(),
+            'language': row['language__name'],
+            'students': [n.strip() for n in names.split(_NAME_SEP)] if names else [],
+        }
+
+
+def _stream_events(rows, role):
+    """Tableau JSON émis événement par événement (mémoire constante)."""
+    yield '['
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + json.dumps(_event(row, role=role), cls=DjangoJSONEncoder)
+    yield ']'
+
+
+def _feed_queryset(request):
     qs = _base_queryset(request)
     start = request.GET.get('start')
     end = request.GET.get('end')
@@ -81,9 +187,115 @@ def api_sessions_feed(request):
             qs = qs.filter(students__id=request.GET['student_id'])
         if request.GET.get('language_id'):
             qs = qs.filter(language_id=request.GET['language_id'])
+    return qs
+
+
+def _feed_window(request):
+    """Bornes (start, end) de la fenêtre demandée, None si absentes ou invalides."""
+    def parse(value):
+        try:
+            return date.fromisoformat(value[:10])
+        except (TypeError, ValueError):
+            return None
+    return parse(request.GET.get('start')), parse(request.GET.get('end'))
+
+
+def _series_queryset(request):
+    """Séries à horizon glissant visibles (mêmes filtres que _feed_queryset)."""
+    role = request.user.role
+    qs = SessionSeries.objects.filter(recurrence_end__isnull=True)
+    if role == 'teacher':
+        qs = qs.filter(teacher=request.user.teacher)
+    elif role == 'student':
+        qs = qs.filter(students=request.user.student)
+    elif role == 'admin':
+        if request.GET.get('teacher_id'):
+            qs = qs.filter(teacher_id=request.GET['teacher_id'])
+        if request.GET.get('student_id'):
+            qs = qs.filter(students__id=request.GET['student_id'])
+        if request.GET.get('language_id'):
+            qs = qs.filter(language_id=request.GET['language_id'])
+    return qs
+
+
+def _virtual_rows(request):
+    """
+    Occurrences des séries au-delà de leur horizon de génération, calculées
+    depuis la règle de récurrence (fenêtres lointaines du calendrier).
+    """
+    start, end = _feed_window(request)
+    if start is None or end is None:
+        return
+    series_list = (
+        _series_queryset(request)
+        .filter(Q(materialized_until__isnull=True) | Q(materialized_until__lt=end))
+        .select_related('teacher__user', 'language')
+        .prefetch_related('students__user')
+    )
+    for series, index, day in virtual_series_occurrences(series_list, start, end):
+        yield {
+            'id': f'series-{series.pk}-{index}',
+            'virtual': True,
+            'series_id': series.pk,
+            'date': day,
+            'start_time': series.start_time,
+            'end_time': series.end_time,
+            'status': 'scheduled',
+            'event_color': '',
+            'fiche_completee': False,
+            'seance_realisee': False,
+            'teacher_name': series.teacher.user.get_full_name(),
+            'language': str(series.language),
+            'students': [s.user.get_full_name() for s in series.students.all()],
+        }
+
+
+def _feed_fingerprint(request):
+    """
+    Empreinte de la fenêtre demandée (COUNT + MAX(updated_at) des séances, et des
+    séries à horizon glissant si la fenêtre est bornée), calculée une fois par
+    requête HTTP pour l'ETag.
+    """
+    if not hasattr(request, '_feed_fingerprint'):
+        fp = _feed_queryset(request).aggregate(
+            count=Count('id'), last_modified=Max('updated_at'),
+        )
+        fp['series_count'] = fp['series_modified'] = None
+        if all(_feed_window(request)):
+            fp.update(_series_queryset(request).aggregate(
+                series_count=Count('id'), series_modified=Max('updated_at'),
+            ))
+        request._feed_fingerprint = fp
+    return request._feed_fingerprint
+
+
+def _feed_etag(request):
+    fp = _feed_fingerprint(request)
+    key = ':'.join([
+        str(request.user.pk), request.user.role, request.GET.urlencode(),
+        *(
+            value.isoformat() if hasattr(value, 'isoformat') else str(value)
+            for value in (fp['count'], fp['last_modified'], fp['series_count'], fp['series_modified'])
+        ),
+    ])
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+@login_required
+@require_GET
+# Pas de Last-Modified : MAX(updated_at) ne bouge pas quand une séance est
+# supprimée, If-Modified-Since renverrait alors un 304 périmé. L'ETag inclut le COUNT.
+@condition(etag_func=_feed_etag)
+def api_sessions_feed(request):
+    """
+    FullCalendar feed — GET /api/sessions/?start=...&end=...
+    Répond 304 sans sérialiser si If-None-Match correspond.
+    """
     role = request.user.role
-    events = [_session_to_event(s, role=role) for s in qs.order_by('date', 'start_time')]
-    return JsonResponse(events, safe=False)
+    rows = itertools.chain(_feed_rows(_feed_queryset(request)), _virtual_rows(request))
+    response = StreamingHttpResponse(_stream_events(rows, role), content_type='application/json')
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @login_required
@@ -124,7 +336,7 @@ def api_session_create(request):
         session.save()
         form.save_m2m()
         return JsonResponse({'success': True, 'session_id': session.id,
-                             'event': _session_to_event(session, role=request.user.role)})
+                             'event': _single_event(session, role=request.user.role)})
     return JsonResponse({'success': False, 'errors': form.errors}, status=400)
 
 
@@ -150,14 +362,14 @@ def api_session_update(request, session_id):
         if 'end_time' in data:
             session.end_time = data['end_time']
         session.save(update_fields=['date', 'start_time', 'end_time'])
-        return JsonResponse({'success': True, 'event': _session_to_event(session, role=request.user.role)})
+        return JsonResponse({'success': True, 'event': _single_event(session, role=request.user.role)})
 
     # Form POST
     teacher = request.user.teacher if request.user.role == 'teacher' else None
     form = SessionForm(request.POST, instance=session, teacher=teacher)
     if form.is_valid():
         form.save()
-        return JsonResponse({'success': True, 'event': _session_to_event(session)})
+        return JsonResponse({'success': True, 'event': _single_event(session)})
     return JsonResponse({'success': False, 'errors': form.errors}, status=400)
 
 
@@ -190,12 +402,37 @@ def api_session_status(request, session_id):
     session.status = new_status
     session.save(update_fields=['status'])
     return JsonResponse({'success': True, 'status': new_status,
-                         'event': _session_to_event(session, role=request.user.role)})
+                         'event': _single_event(session, role=request.user.role)})
 
 
 @login_required
 @require_GET
 def api_notifications_unread(request):
-    """GET /api/notifications/unread/ — polling badge"""
-    count = Notification.objects.filter(user=request.user, is_read=False).count()
+    """GET /api/notifications/unread/ — polling badge (compteur en cache)"""
+    count = unread_count(request.user.pk)
     return JsonResponse({'count': count})
+
+
+@login_required
+@require_POST
+def api_notifications_bulk(request):
+    """
+    POST /api/notifications/bulk/
+    body: {action: 'read'|'delete', ids: [1, 2]} ou {action, cursor: '<curseur>'}
+    (la notification du curseur et toutes les plus anciennes ; sans ids ni
+    cursor : toutes). Renvoie le nouveau compteur de non-lues.
+    """
+    try:
+        data = json.loads(request.body)
+        action, ids, cursor = data.get('action'), data.get('ids'), data.get('cursor')
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'JSON invalide'}, status=400)
+    if ids is not None and not (
+        isinstance(ids, list) and all(isinstance(pk, int) for pk in ids)
+    ):
+        return JsonResponse({'success': False, 'error': 'ids invalides'}, status=400)
+    try:
+        count = apply_bulk_action(request.user.pk, action, ids=ids, cursor=cursor)
+    except ValueError as exc:
+        return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+    return JsonResponse({'success': True, 'count': count})
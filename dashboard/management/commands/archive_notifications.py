@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dashboard.notifications import archive_read_notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Déplace les notifications lues plus anciennes que la durée de rétention "
+        "vers la table d'archive, par lots."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'NOTIFICATIONS_RETENTION_DAYS', 90),
+            help="Âge minimal (en jours) des notifications lues à archiver.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Nombre de notifications déplacées par transaction.",
+        )
+
+    def handle(self, *args, **options):
+        archived = archive_read_notifications(days=options['days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{archived} notification(s) archivée(s)."))
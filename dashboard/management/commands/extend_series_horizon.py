@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.services import extend_series_horizons
+
+
+class Command(BaseCommand):
+    help = (
+        "Prolonge l'horizon glissant des séries récurrentes sans date de fin "
+        "(fait aussi à la première requête du jour par SeriesHorizonMiddleware)."
+    )
+
+    def handle(self, *args, **options):
+        count = extend_series_horizons()
+        self.stdout.write(self.style.SUCCESS(f"{count} séances générées."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.services import rebuild_monthly_rollups
+
+
+class Command(BaseCommand):
+    help = "Reconstruit la table MonthlyRollup (graphes du tableau de bord admin) depuis les données sources."
+
+    def handle(self, *args, **options):
+        count = rebuild_monthly_rollups()
+        self.stdout.write(self.style.SUCCESS(f"{count} mois recalculés."))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.services import reconcile_student_hours
+
+
+class Command(BaseCommand):
+    help = (
+        "Vérifie les heures achetées / consommées dénormalisées de chaque étudiant "
+        "par rapport aux paiements et aux séances terminées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help="Corrige les écarts trouvés.",
+        )
+
+    def handle(self, *args, **options):
+        mismatches = reconcile_student_hours(fix=options['fix'])
+        for student, field, stored, expected in mismatches:
+            self.stdout.write(f"{student} — {field} : {stored} (attendu {expected})")
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Aucun écart."))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"{len(mismatches)} écart(s) corrigé(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(mismatches)} écart(s). Relancer avec --fix pour corriger."))
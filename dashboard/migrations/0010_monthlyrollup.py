@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_add_session_event_color'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True, verbose_name='mois (1er jour)')),
+                ('sessions_scheduled', models.PositiveIntegerField(default=0, verbose_name='séances prévues')),
+                ('sessions_completed', models.PositiveIntegerField(default=0, verbose_name='séances terminées')),
+                ('sessions_cancelled', models.PositiveIntegerField(default=0, verbose_name='séances annulées')),
+                ('sessions_rescheduled', models.PositiveIntegerField(default=0, verbose_name='séances reportées')),
+                ('sessions_absent', models.PositiveIntegerField(default=0, verbose_name='absences')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name="chiffre d'affaires (paiements payés)")),
+                ('new_students', models.PositiveIntegerField(default=0, verbose_name='nouveaux étudiants')),
+                ('teacher_payouts', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='paiements formateurs versés')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='date de mise à jour')),
+            ],
+            options={
+                'verbose_name': 'statistique mensuelle',
+                'verbose_name_plural': 'statistiques mensuelles',
+                'ordering': ['month'],
+            },
+        ),
+    ]
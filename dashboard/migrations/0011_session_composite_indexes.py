@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_monthlyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['teacher', 'date'], name='session_teacher_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['teacher', 'status'], name='session_teacher_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['date', 'status'], name='session_date_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(condition=models.Q(('seance_realisee', True)), fields=['date', 'teacher'], name='session_realisee_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(condition=models.Q(('fiche_completee', True)), fields=['statut_validation'], name='session_fiche_valid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['series', 'series_index'], name='session_series_index_idx'),
+        ),
+        # Table de liaison auto-générée Session.students : l'index unique existant
+        # couvre (session_id, student_id) ; on ajoute le sens étudiant → séances.
+        migrations.RunSQL(
+            sql='CREATE INDEX session_students_student_idx ON dashboard_session_students (student_id, session_id);',
+            reverse_sql='DROP INDEX session_students_student_idx;',
+        ),
+    ]
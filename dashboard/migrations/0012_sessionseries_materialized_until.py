@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:10
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_existing_series_materialized(apps, schema_editor):
+    # Les séries existantes ont été générées en entier (fin ou 12 mois)
+    SessionSeries = apps.get_model('dashboard', 'SessionSeries')
+    for series in SessionSeries.objects.all():
+        series.materialized_until = series.recurrence_end or (
+            series.recurrence_start + timedelta(days=365)
+        )
+        series.save(update_fields=['materialized_until'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_session_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionseries',
+            name='materialized_until',
+            field=models.DateField(blank=True, null=True, verbose_name="séances générées jusqu'au"),
+        ),
+        migrations.AddField(
+            model_name='sessionseries',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(mark_existing_series_materialized, migrations.RunPython.noop),
+    ]
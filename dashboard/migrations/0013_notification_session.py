@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:52
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+_SESSION_REF = re.compile(r'Session (\d+) ')
+
+
+def link_evaluation_requests(apps, schema_editor):
+    # Les demandes d'évaluation existantes portaient l'id de séance dans le message
+    Notification = apps.get_model('dashboard', 'Notification')
+    Session = apps.get_model('dashboard', 'Session')
+    session_ids = set(Session.objects.values_list('pk', flat=True))
+    seen = set()
+    to_update = []
+    for notification in Notification.objects.filter(
+        notification_type='evaluation_request', message__contains='Session '
+    ).order_by('created_at').only('pk', 'user_id', 'message'):
+        match = _SESSION_REF.search(notification.message)
+        if not match or int(match.group(1)) not in session_ids:
+            continue
+        key = (notification.user_id, int(match.group(1)))
+        if key in seen:
+            continue
+        seen.add(key)
+        notification.session_id = key[1]
+        to_update.append(notification)
+    Notification.objects.bulk_update(to_update, ['session'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_sessionseries_materialized_until'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='dashboard.session', verbose_name='séance'),
+        ),
+        migrations.RunPython(link_evaluation_requests, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('session__isnull', False)), fields=('session', 'user', 'notification_type'), name='notification_session_user_type_uniq'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0014_notification_user_read_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('session_reminder', 'Rappel de séance'), ('payment_due', 'Paiement dû'), ('certificate_ready', 'Certificat disponible'), ('evaluation_ready', 'Évaluation disponible'), ('evaluation_request', "Demande d'évaluation"), ('system', 'Système')], max_length=20, verbose_name='type de notification')),
+                ('title', models.CharField(max_length=200, verbose_name='titre')),
+                ('message', models.TextField(verbose_name='message')),
+                ('created_at', models.DateTimeField(verbose_name='date de création')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name="date d'archivage")),
+            ],
+            options={
+                'verbose_name': 'notification archivée',
+                'verbose_name_plural': 'notifications archivées',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='notification_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['-created_at', '-id'], name='notification_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivednotification',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_notifications', to='dashboard.session', verbose_name='séance'),
+        ),
+        migrations.AddField(
+            model_name='archivednotification',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to=settings.AUTH_USER_MODEL, verbose_name='utilisateur'),
+        ),
+        migrations.AddIndex(
+            model_name='archivednotification',
+            index=models.Index(fields=['user', '-created_at'], name='archivednotif_user_created_idx'),
+        ),
+    ]
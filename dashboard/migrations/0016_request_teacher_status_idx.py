@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0015_notification_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['teacher', 'status', '-created_at'], name='request_teacher_status_idx'),
+        ),
+    ]
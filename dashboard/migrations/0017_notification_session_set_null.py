@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0016_request_teacher_status_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='dashboard.session', verbose_name='séance'),
+        ),
+    ]
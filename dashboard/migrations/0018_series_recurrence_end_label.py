@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0017_notification_session_set_null'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sessionseries',
+            name='recurrence_end',
+            field=models.DateField(blank=True, null=True, verbose_name='fin de la série (vide = sans fin)'),
+        ),
+    ]
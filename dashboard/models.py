@@ -7,6 +7,7 @@ from django.dispatch import receiver
 from django.db.models import Avg
 from django.utils import timezone
 from datetime import datetime, timedelta
+import math
 import re
 
 
@@ -115,8 +116,92 @@ class Language(models.Model):
     def __str__(self):
         return self.name
 
+
+class LoadedStateMixin:
+    """
+    Suivi d'état : mémorise les valeurs lues en base (from_db) et les rafraîchit
+    après save() / refresh_from_db(), pour détecter les changements sans SELECT.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not models.DEFERRED
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._remember_loaded_values(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_loaded_values(fields)
+
+    def _remember_loaded_values(self, fields=None):
+        names = None if fields is None else {self._meta.get_field(f).attname for f in fields}
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            **getattr(self, '_loaded_values', {}),
+            **{
+                f.attname: getattr(self, f.attname)
+                for f in self._meta.concrete_fields
+                if (names is None or f.attname in names) and f.attname not in deferred
+            },
+        }
+
+    def has_loaded_value(self, attname):
+        return attname in getattr(self, '_loaded_values', {})
+
+    def loaded_value(self, attname, default=None):
+        """Valeur du champ au chargement (ou à la dernière sauvegarde) de l'instance."""
+        return getattr(self, '_loaded_values', {}).get(attname, default)
+
+    def previous_values(self, *attnames):
+        """
+        Valeurs en base des champs donnés, avant modification : lues dans l'état
+        chargé, sinon par un SELECT (instance construite à la main, champ différé).
+        None pour une instance pas encore enregistrée.
+        """
+        if self._state.adding or self.pk is None:
+            return None
+        if all(self.has_loaded_value(a) for a in attnames):
+            return tuple(self.loaded_value(a) for a in attnames)
+        return type(self)._base_manager.filter(pk=self.pk).values_list(*attnames).first()
+
+    def changed_fields(self):
+        """
+        Noms des champs modifiés depuis le chargement. Un champ dont la valeur
+        chargée est inconnue (instance neuve, champ différé) est considéré modifié.
+        """
+        loaded = getattr(self, '_loaded_values', {})
+        return {
+            f.name for f in self._meta.concrete_fields
+            if f.attname not in loaded or loaded[f.attname] != getattr(self, f.attname)
+        }
+
+
+class StudentQuerySet(models.QuerySet):
+    def with_hours(self):
+        """
+        Annote les heures consommées (séances terminées) calculées en SQL,
+        lues ensuite par computed_hours_used / hours_remaining sans requête supplémentaire.
+        Sous-requêtes corrélées : pas de doublons avec les autres annotations jointes.
+        """
+        completed = (
+            Session.objects.filter(students=models.OuterRef('pk'))
+            .order_by()
+            .values('students')
+        )
+        return self.annotate(**{
+            f'hours_{name}': models.Subquery(completed.annotate(v=expr).values('v'))
+            for name, expr in completed_duration_sums().items()
+        })
+
+
 # Étudiant
-class Student(models.Model):
+class Student(LoadedStateMixin, models.Model):
     
     STUDENT_STATUT= (
         ('actif', 'Actif'),
@@ -170,14 +255,19 @@ class Student(models.Model):
         verbose_name="objectif de formation"
     )
 
+    objects = StudentQuerySet.as_manager()
+
     class Meta:
         verbose_name = "étudiant"
         verbose_name_plural = "étudiants"
 
     @property
     def computed_hours_used(self):
-        sessions = Session.objects.filter(students=self, status='completed')
-        return round(sum(s.duration_hours for s in sessions), 1)
+        # Valeur annotée par Student.objects.with_hours() si disponible
+        if 'hours_completed_minutes' in self.__dict__:
+            return duration_sums_to_hours(self.hours_completed_minutes, self.hours_completed_span)
+        sums = Session.objects.filter(students=self).aggregate(**completed_duration_sums())
+        return duration_sums_to_hours(sums['completed_minutes'], sums['completed_span'])
 
     @property
     def hours_remaining(self):
@@ -394,7 +484,7 @@ class Submission(models.Model):
         return f"{self.student} - {self.assignment}"
 
 # Séances de cours
-class Session(models.Model):
+class Session(LoadedStateMixin, models.Model):
     STATUS_CHOICES = [
         ('scheduled', 'Prévue'),
         ('completed', 'Terminée'),
@@ -577,6 +667,25 @@ class Session(models.Model):
         ordering = ['-date', '-start_time']
         verbose_name = "séance"
         verbose_name_plural = "séances"
+        indexes = [
+            # Plannings formateur (jour, semaine, historique)
+            models.Index(fields=['teacher', 'date'], name='session_teacher_date_idx'),
+            models.Index(fields=['teacher', 'status'], name='session_teacher_status_idx'),
+            # Compteurs globaux par période / statut (tableau de bord admin)
+            models.Index(fields=['date', 'status'], name='session_date_status_idx'),
+            # Reporting : uniquement les séances réalisées
+            models.Index(
+                fields=['date', 'teacher'], condition=models.Q(seance_realisee=True),
+                name='session_realisee_date_idx',
+            ),
+            # Fiches en attente de validation
+            models.Index(
+                fields=['statut_validation'], condition=models.Q(fiche_completee=True),
+                name='session_fiche_valid_idx',
+            ),
+            # Propagation des modifications de série
+            models.Index(fields=['series', 'series_index'], name='session_series_index_idx'),
+        ]
 
     @property
     def duration_hours(self):
@@ -604,6 +713,43 @@ class Session(models.Model):
         return f"{self.teacher} - {self.language} - {self.date} ({self.get_status_display()})"
 
 
+def completed_duration_sums(prefix=''):
+    """
+    Agrégats SQL de la durée des séances terminées, même règle que duration_hours :
+    duree_minutes si renseignée, sinon end_time - start_time.
+    prefix : chemin vers la séance ('' depuis Session, 'sessions__' depuis Student).
+    """
+    completed = models.Q(**{f'{prefix}status': 'completed'})
+    has_minutes = models.Q(**{f'{prefix}duree_minutes__gt': 0})
+    return {
+        'completed_minutes': models.Sum(f'{prefix}duree_minutes', filter=completed & has_minutes),
+        'completed_span': models.Sum(
+            models.ExpressionWrapper(
+                models.F(f'{prefix}end_time') - models.F(f'{prefix}start_time'),
+                output_field=models.DurationField(),
+            ),
+            filter=completed & ~has_minutes,
+        ),
+    }
+
+
+def rounded_session_hours(hours) -> int:
+    """
+    Heures d'une séance telles que comptées dans Student.total_hours_used
+    (IntegerField) : arrondi à l'heure la plus proche, une demi-heure vers le
+    haut (1.5 -> 2, 2.5 -> 3). Même règle pour le signal et la réconciliation.
+    """
+    return math.floor(hours + 0.5)
+
+
+def duration_sums_to_hours(minutes, span):
+    """Convertit le résultat de completed_duration_sums en heures (arrondi à 0.1)."""
+    hours = (minutes or 0) / 60
+    if span:
+        hours += span.total_seconds() / 3600
+    return round(hours, 1)
+
+
 # Séances récurrentes — série
 class SessionSeries(models.Model):
     DAY_CHOICES = [
@@ -626,7 +772,7 @@ class SessionSeries(models.Model):
     end_time = models.TimeField(verbose_name="heure de fin")
     recurrence_start = models.DateField(verbose_name="début de la série")
     recurrence_end = models.DateField(
-        null=True, blank=True, verbose_name="fin de la série (vide = 12 mois)"
+        null=True, blank=True, verbose_name="fin de la série (vide = sans fin)"
     )
     type_seance = models.CharField(
         max_length=20,
@@ -635,7 +781,13 @@ class SessionSeries(models.Model):
     )
     meeting_link = models.URLField(blank=True, null=True, verbose_name="lien de réunion")
     notes = models.TextField(blank=True, verbose_name="notes")
+    # Dernière date jusqu'à laquelle les occurrences Session ont été créées
+    # (horizon glissant pour les séries sans recurrence_end)
+    materialized_until = models.DateField(
+        null=True, blank=True, verbose_name="séances générées jusqu'au"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "série de séances"
@@ -647,7 +799,7 @@ class SessionSeries(models.Model):
 
 
 # Paiements
-class Payment(models.Model):
+class Payment(LoadedStateMixin, models.Model):
     PAYMENT_TYPES = [
         ('hourly', 'À l\'heure'),
         ('package', 'Pack d\'heures'),
@@ -934,6 +1086,27 @@ class Resource(models.Model):
     
     
 # Demandes/Réquêtes
+class RequestQuerySet(models.QuerySet):
+    def for_teacher(self, teacher):
+        """
+        Demandes visibles par un formateur : adressées à lui ou envoyées par
+        un de ses étudiants actuels. Sous-requête plutôt que jointure sur
+        current_teachers : pas de doublons, donc ni distinct() ni Count(distinct).
+        """
+        students = Student.objects.filter(current_teachers=teacher).values('pk')
+        return self.filter(models.Q(teacher=teacher) | models.Q(student__in=students))
+
+    def stats(self):
+        """Total et nombre par statut, en une seule requête d'agrégats conditionnels."""
+        return self.order_by().aggregate(
+            total=models.Count('id'),
+            **{
+                status: models.Count('id', filter=models.Q(status=status))
+                for status, _ in Request.STATUS_CHOICES
+            },
+        )
+
+
 class Request(models.Model):
     REQUEST_TYPES = [
         ('absence', 'Justification d\'absence'),
@@ -998,10 +1171,16 @@ class Request(models.Model):
         verbose_name="date de mise à jour"
     )
 
+    objects = RequestQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = "demande"
         verbose_name_plural = "demandes"
+        indexes = [
+            # Boîte de réception du formateur (filtre de statut, tri par date)
+            models.Index(fields=['teacher', 'status', '-created_at'], name='request_teacher_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.user.username} - {self.subject} ({self.get_status_display()})"
@@ -1033,6 +1212,16 @@ class Notification(models.Model):
         verbose_name="titre"
     )
     message = models.TextField(verbose_name="message")
+    # Séance concernée : clé de déduplication (une notification par type, séance et utilisateur).
+    # SET_NULL : supprimer une séance ne supprime pas l'historique des notifications
+    session = models.ForeignKey(
+        Session,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notifications',
+        verbose_name="séance"
+    )
     is_read = models.BooleanField(
         default=False,
         verbose_name="lu"
@@ -1046,10 +1235,77 @@ class Notification(models.Model):
         ordering = ['-created_at']
         verbose_name = "notification"
         verbose_name_plural = "notifications"
+        indexes = [
+            # Compteur de non-lues (badge)
+            models.Index(fields=['user', 'is_read'], name='notification_user_read_idx'),
+            # Pagination par curseur (boîte de réception, liste admin) et archivage
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='notification_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['session', 'user', 'notification_type'],
+                condition=models.Q(session__isnull=False),
+                name='notification_session_user_type_uniq',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user} - {self.title}"
 
+    def delete(self, *args, **kwargs):
+        # Invalidation du compteur ici plutôt qu'en post_delete : un receiver
+        # désactiverait la suppression rapide (un seul DELETE) des querysets
+        from dashboard.notifications import invalidate_unread
+        result = super().delete(*args, **kwargs)
+        invalidate_unread([self.user_id])
+        return result
+
+
+# Notifications lues déplacées hors de la table Notification après
+# NOTIFICATIONS_RETENTION_DAYS jours (commande archive_notifications)
+class ArchivedNotification(models.Model):
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='archived_notifications',
+        verbose_name="utilisateur"
+    )
+    notification_type = models.CharField(
+        max_length=20,
+        choices=Notification.NOTIFICATION_TYPES,
+        verbose_name="type de notification"
+    )
+    title = models.CharField(
+        max_length=200,
+        verbose_name="titre"
+    )
+    message = models.TextField(verbose_name="message")
+    session = models.ForeignKey(
+        Session,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_notifications',
+        verbose_name="séance"
+    )
+    created_at = models.DateTimeField(verbose_name="date de création")
+    archived_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="date d'archivage"
+    )
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "notification archivée"
+        verbose_name_plural = "notifications archivées"
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archivednotif_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.title}"
+
 # Commentaires étudiant sur enseignant
 class Comment(models.Model):
     comment = models.TextField(
@@ -1096,7 +1352,7 @@ class Comment(models.Model):
     
     
 # Paiements formateurs
-class PaiementFormateur(models.Model):
+class PaiementFormateur(LoadedStateMixin, models.Model):
     STATUT_CHOICES = [
         ('en_attente', 'En attente'),
         ('paye', 'Payé'),
@@ -1177,6 +1433,44 @@ class PaiementFormateur(models.Model):
         return self.montant_calcule
 
 
+# Agrégats mensuels pré-calculés (graphes du tableau de bord admin)
+class MonthlyRollup(models.Model):
+    month = models.DateField(
+        unique=True,
+        verbose_name="mois (1er jour)"
+    )
+    sessions_scheduled = models.PositiveIntegerField(default=0, verbose_name="séances prévues")
+    sessions_completed = models.PositiveIntegerField(default=0, verbose_name="séances terminées")
+    sessions_cancelled = models.PositiveIntegerField(default=0, verbose_name="séances annulées")
+    sessions_rescheduled = models.PositiveIntegerField(default=0, verbose_name="séances reportées")
+    sessions_absent = models.PositiveIntegerField(default=0, verbose_name="absences")
+    revenue = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name="chiffre d'affaires (paiements payés)"
+    )
+    new_students = models.PositiveIntegerField(default=0, verbose_name="nouveaux étudiants")
+    teacher_payouts = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name="paiements formateurs versés"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="date de mise à jour"
+    )
+
+    class Meta:
+        ordering = ['month']
+        verbose_name = "statistique mensuelle"
+        verbose_name_plural = "statistiques mensuelles"
+
+    def __str__(self):
+        return self.month.strftime('%m/%Y')
+
+
 @receiver(post_save, sender=CustomUser)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
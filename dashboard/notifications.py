@@ -0,0 +1,134 @@
+"""
+Notifications : création groupée (fan-out) pour plusieurs destinataires et
+compteur de non-lues par utilisateur, gardé dans le cache partagé (CACHES).
+
+Le compteur est supprimé du cache à chaque création / lecture / suppression
+(post_save, Notification.delete(), notify, apply_bulk_action, admin) et
+recompté au besoin : le polling du badge (api_notifications_unread) ne lance
+un COUNT qu'après un changement.
+
+Rétention : les notifications lues de plus de NOTIFICATIONS_RETENTION_DAYS
+jours sont déplacées par lots dans ArchivedNotification.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from dashboard.models import ArchivedNotification, Notification
+from dashboard.pagination import decode_cursor
+
+UNREAD_CACHE_KEY = 'notifications:unread:{}'
+
+
+def _user_ids(users):
+    if isinstance(users, QuerySet):
+        users = users.values_list('pk', flat=True)
+    # Ordre conservé, doublons écartés
+    return list(dict.fromkeys(getattr(user, 'pk', user) for user in users))
+
+
+def notify(users, notification_type, title, message, session=None) -> list:
+    """
+    Crée la même notification pour tous les destinataires en un seul INSERT.
+    users : utilisateurs, ids ou QuerySet de CustomUser (lu en une requête).
+    Avec session, une notification (séance, utilisateur, type) déjà existante
+    est ignorée par la contrainte d'unicité.
+    """
+    rows = [
+        Notification(
+            user_id=user_id,
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            session=session,
+        )
+        for user_id in _user_ids(users)
+    ]
+    if not rows:
+        return []
+    created = Notification.objects.bulk_create(rows, ignore_conflicts=session is not None)
+    invalidate_unread(row.user_id for row in rows)
+    return created
+
+
+def unread_count(user_id) -> int:
+    """
+    Nombre de notifications non lues (cache, sinon un COUNT indexé).
+    Un queryset.update() / delete() sur Notification hors de ce module et de
+    l'admin n'invalide pas le compteur : il reste faux au plus
+    NOTIFICATIONS_UNREAD_CACHE_TIMEOUT secondes.
+    """
+    key = UNREAD_CACHE_KEY.format(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.set(key, count, getattr(settings, 'NOTIFICATIONS_UNREAD_CACHE_TIMEOUT', 60 * 5))
+    return count
+
+
+def invalidate_unread(user_ids) -> None:
+    cache.delete_many([UNREAD_CACHE_KEY.format(user_id) for user_id in set(user_ids)])
+
+
+def apply_bulk_action(user_id, action: str, ids=None, cursor=None) -> int:
+    """
+    Marque comme lues (action='read') ou supprime (action='delete') en une
+    requête les notifications de l'utilisateur :
+    - ids : celles de la liste ;
+    - cursor : celle du curseur et toutes les plus anciennes ;
+    - sinon : toutes.
+    Renvoie le nombre de notifications non lues restantes.
+    """
+    notifications = Notification.objects.filter(user_id=user_id)
+    if ids is not None:
+        notifications = notifications.filter(pk__in=ids)
+    elif cursor is not None:
+        position = decode_cursor(cursor)
+        if position is None:
+            raise ValueError("Curseur invalide")
+        created_at, pk = position
+        notifications = notifications.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lte=pk)
+        )
+
+    if action == 'read':
+        notifications.filter(is_read=False).update(is_read=True)
+    elif action == 'delete':
+        notifications.delete()
+    else:
+        raise ValueError(f"Action inconnue : {action}")
+    invalidate_unread([user_id])
+    return unread_count(user_id)
+
+
+ARCHIVED_FIELDS = ('user_id', 'notification_type', 'title', 'message', 'session_id', 'created_at')
+
+
+def archive_read_notifications(days=None, batch_size=1000) -> int:
+    """
+    Déplace les notifications lues plus anciennes que days jours (par défaut
+    NOTIFICATIONS_RETENTION_DAYS) vers ArchivedNotification, par lots de
+    batch_size : chaque lot est un INSERT groupé et un DELETE dans sa propre
+    transaction. Renvoie le nombre de notifications archivées.
+    """
+    if days is None:
+        days = getattr(settings, 'NOTIFICATIONS_RETENTION_DAYS', 90)
+    cutoff = timezone.now() - timedelta(days=days)
+    candidates = Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by('pk')
+
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(candidates.values('pk', *ARCHIVED_FIELDS)[:batch_size])
+            if not rows:
+                return archived
+            ArchivedNotification.objects.bulk_create(
+                ArchivedNotification(**{field: row[field] for field in ARCHIVED_FIELDS})
+                for row in rows
+            )
+            Notification.objects.filter(pk__in=[row['pk'] for row in rows]).delete()
+        archived += len(rows)
@@ -0,0 +1,134 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Count, Q
+from django.utils.functional import cached_property
+
+
+class PastThenFutureSessions:
+    """
+    Séquence paresseuse pour Paginator : séances passées (les plus récentes
+    d'abord) puis séances futures (les plus proches d'abord).
+    Une page ne lit que ses lignes (au plus deux tranches LIMIT/OFFSET)
+    plus un comptage conditionnel, sans charger toute la table en mémoire.
+    """
+
+    def __init__(self, queryset, today):
+        self.today = today
+        self.queryset = queryset.order_by()
+        self.past = queryset.filter(date__lte=today).order_by('-date', '-start_time', '-id')
+        self.future = queryset.filter(date__gt=today).order_by('date', 'start_time', 'id')
+
+    @cached_property
+    def _counts(self):
+        return self.queryset.aggregate(
+            total=Count('id'),
+            past=Count('id', filter=Q(date__lte=self.today)),
+        )
+
+    def count(self):
+        return self._counts['total']
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError("PastThenFutureSessions ne supporte que les tranches simples.")
+        start, stop = key.start or 0, key.stop if key.stop is not None else self.count()
+        past_count = self._counts['past']
+        rows = []
+        if start < past_count:
+            rows += list(self.past[start:min(stop, past_count)])
+        if stop > past_count:
+            rows += list(self.future[max(start - past_count, 0):stop - past_count])
+        return rows
+
+
+# Pagination par curseur (keyset) sur (created_at, id), du plus récent au plus
+# ancien. Contrairement à Paginator, ni COUNT ni OFFSET : chaque page est une
+# requête indexée « WHERE (created_at, id) < curseur LIMIT n+1 », quel que soit
+# le nombre de lignes déjà parcourues.
+
+def encode_cursor(obj) -> str:
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) du curseur, ou None s'il est absent ou invalide."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def start_cursor(self):
+        """Curseur de la première ligne (actions groupées « jusqu'ici »)."""
+        return encode_cursor(self.object_list[0]) if self.object_list else None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def cursor_paginate(queryset, after=None, before=None, per_page=20) -> CursorPage:
+    """
+    Page de queryset (ordre -created_at, -id) suivant le curseur after, ou
+    précédant le curseur before. Une seule requête : per_page + 1 lignes
+    sont lues pour savoir s'il reste une page au-delà.
+    """
+    position = decode_cursor(before)
+    if position is not None:
+        created_at, pk = position
+        rows = list(
+            queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+            .order_by('created_at', 'pk')[:per_page + 1]
+        )
+        more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return CursorPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1]) if rows else None,
+            previous_cursor=encode_cursor(rows[0]) if more else None,
+        )
+
+    position = decode_cursor(after)
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+    rows = list(queryset.order_by('-created_at', '-pk')[:per_page + 1])
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    return CursorPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1]) if more else None,
+        previous_cursor=encode_cursor(rows[0]) if position is not None and rows else None,
+    )
@@ -0,0 +1,287 @@
+"""
+Reporting pédagogique : agrégats par formateur et par étudiant sur une période.
+Seules les séances réalisées (seance_realisee=True) sont prises en compte.
+
+Les agrégats (identifiants et nombres uniquement) sont mis en cache sous une
+clé qui inclut un jeton de version par (formateur, mois) ; les signaux de
+Session changent ce jeton pour les seuls formateurs et mois touchés. Les
+objets Teacher / Student sont relus à chaque affichage.
+"""
+import hashlib
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q
+
+from dashboard.models import Session, Student, Teacher
+from dashboard.services import add_months, month_start
+
+# (champ booléen de Session, libellé affiché)
+COMPETENCES = (
+    ('comp_oral', 'Oral'),
+    ('comp_comprehension', 'Compréhension'),
+    ('comp_ecrit', 'Écrit'),
+    ('comp_grammaire', 'Grammaire'),
+    ('comp_vocabulaire', 'Vocabulaire'),
+)
+
+# Score moyen (participation, compréhension, engagement) sous lequel un étudiant est "en difficulté"
+SEUIL_DIFFICULTE = 2.5
+
+# Champs de Session dont la modification change un rapport
+REPORTING_FIELDS = frozenset({
+    'seance_realisee', 'statut_validation', 'date', 'teacher',
+    'participation', 'comprehension_score', 'engagement',
+    *(field for field, _ in COMPETENCES),
+})
+
+
+def realised_sessions(date_debut, date_fin, teacher=None):
+    qs = Session.objects.filter(date__gte=date_debut, date__lte=date_fin, seance_realisee=True)
+    if teacher is not None:
+        qs = qs.filter(teacher=teacher)
+    return qs
+
+
+def is_en_difficulte(avg_participation, avg_comprehension, avg_engagement):
+    score = (avg_participation or 0) + (avg_comprehension or 0) + (avg_engagement or 0)
+    return score > 0 and score / 3 < SEUIL_DIFFICULTE
+
+
+def _top_competence(counts):
+    """Compétence la plus travaillée (première dans COMPETENCES en cas d'égalité)."""
+    return max(counts, key=counts.get) if any(counts.values()) else None
+
+
+def _teachers_rows(date_debut, date_fin) -> dict:
+    """
+    Agrégats de admin_reporting_list en deux requêtes groupées :
+    - par formateur : séances, validées, étudiants distincts, compteurs par compétence ;
+    - par (formateur, étudiant) : moyennes des trois scores.
+    """
+    sessions = realised_sessions(date_debut, date_fin).order_by()
+
+    per_teacher = list(
+        sessions.values('teacher').annotate(
+            nb_sessions=Count('id', distinct=True),
+            nb_sessions_validees=Count('id', filter=Q(statut_validation='validee'), distinct=True),
+            nb_students=Count('students', distinct=True),
+            **{
+                field: Count('id', filter=Q(**{field: True}), distinct=True)
+                for field, _ in COMPETENCES
+            },
+        )
+    )
+
+    en_difficulte = {}
+    student_ids = set()
+    per_student = (
+        sessions.filter(students__isnull=False)
+        .values('teacher', 'students')
+        .annotate(
+            avg_p=Avg('participation'),
+            avg_c=Avg('comprehension_score'),
+            avg_e=Avg('engagement'),
+        )
+    )
+    for row in per_student:
+        student_ids.add(row['students'])
+        if is_en_difficulte(row['avg_p'], row['avg_c'], row['avg_e']):
+            en_difficulte[row['teacher']] = en_difficulte.get(row['teacher'], 0) + 1
+
+    return {
+        'per_teacher': sorted(per_teacher, key=lambda r: r['teacher']),
+        'en_difficulte': en_difficulte,
+        'total_students_global': len(student_ids),
+    }
+
+
+def teachers_report(date_debut, date_fin) -> dict:
+    """Lignes de admin_reporting_list (agrégats en cache + une lecture des formateurs)."""
+    rows = _cached_rows('teachers', None, date_debut, date_fin, _teachers_rows)
+
+    teachers = Teacher.objects.select_related('user__user_profile').in_bulk(
+        [row['teacher'] for row in rows['per_teacher']]
+    )
+    teachers_stats = []
+    for row in rows['per_teacher']:
+        if row['teacher'] not in teachers:
+            continue
+        teachers_stats.append({
+            'teacher': teachers[row['teacher']],
+            'nb_sessions': row['nb_sessions'],
+            'nb_sessions_validees': row['nb_sessions_validees'],
+            'nb_students': row['nb_students'],
+            'nb_en_difficulte': rows['en_difficulte'].get(row['teacher'], 0),
+            'top_comp_faible': _top_competence(
+                {label: row[field] for field, label in COMPETENCES}
+            ),
+        })
+
+    return {
+        'teachers_stats': teachers_stats,
+        'total_sessions_global': sum(s['nb_sessions'] for s in teachers_stats),
+        'total_teachers_actifs': len(teachers_stats),
+        'total_students_global': rows['total_students_global'],
+    }
+
+
+def _round_avg(value):
+    return round(value, 1) if value else None
+
+
+def _teacher_rows(teacher_id, date_debut, date_fin) -> dict:
+    """
+    Agrégats d'un formateur :
+    - une requête de comptages conditionnels (total, validées, compétences) ;
+    - une requête values('students').annotate(...) pour les statistiques par étudiant.
+    """
+    sessions = realised_sessions(date_debut, date_fin).filter(teacher_id=teacher_id)
+
+    counts = sessions.aggregate(
+        total=Count('id'),
+        validees=Count('id', filter=Q(statut_validation='validee')),
+        **{field: Count('id', filter=Q(**{field: True})) for field, _ in COMPETENCES},
+    )
+
+    per_student = list(
+        sessions.order_by()
+        .filter(students__isnull=False)
+        .values('students')
+        .annotate(
+            nb_sessions=Count('id'),
+            avg_p=Avg('participation'),
+            avg_c=Avg('comprehension_score'),
+            avg_e=Avg('engagement'),
+        )
+    )
+    return {
+        'counts': counts,
+        'per_student': sorted(per_student, key=lambda r: r['students']),
+    }
+
+
+def teacher_report(teacher, date_debut, date_fin) -> dict:
+    """Contexte commun de admin_reporting_detail et teacher_reporting."""
+    rows = _cached_rows(
+        'teacher', teacher.pk, date_debut, date_fin,
+        lambda debut, fin: _teacher_rows(teacher.pk, debut, fin),
+    )
+    counts = rows['counts']
+
+    students = Student.objects.select_related('user').in_bulk(
+        [row['students'] for row in rows['per_student']]
+    )
+    student_stats = []
+    students_en_difficulte = []
+    for row in rows['per_student']:
+        student = students.get(row['students'])
+        if student is None:
+            continue
+        student_stats.append({
+            'student': student,
+            'nb_sessions': row['nb_sessions'],
+            'avg_participation': _round_avg(row['avg_p']),
+            'avg_comprehension': _round_avg(row['avg_c']),
+            'avg_engagement': _round_avg(row['avg_e']),
+        })
+        if is_en_difficulte(row['avg_p'], row['avg_c'], row['avg_e']):
+            students_en_difficulte.append(student)
+
+    return {
+        'total_sessions': counts['total'],
+        'sessions_validees': counts['validees'],
+        'student_stats': student_stats,
+        'students_en_difficulte': students_en_difficulte,
+        'comp_faibles': {label: counts[field] for field, label in COMPETENCES},
+        'sessions_list': realised_sessions(date_debut, date_fin, teacher=teacher).select_related(
+            'teacher__user', 'language'
+        ).prefetch_related('students__user').order_by('-date', '-start_time'),
+    }
+
+
+# ─────────────────────────────────────────────────────────────
+#  CACHE VERSIONNÉ
+# ─────────────────────────────────────────────────────────────
+
+def _months(date_debut, date_fin):
+    month, last = month_start(date_debut), month_start(date_fin)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def _version_key(teacher_id, month):
+    return f"reporting:v:{teacher_id or 'all'}:{month:%Y-%m}"
+
+
+def _versions(teacher_id, months):
+    """
+    Jetons de version des mois demandés. Un jeton absent (jamais écrit ou
+    évincé) est remplacé par un jeton neuf : une ancienne entrée ne peut
+    donc pas être resservie.
+    """
+    keys = [_version_key(teacher_id, month) for month in months]
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def _cached_rows(kind, teacher_id, date_debut, date_fin, compute):
+    versions = _versions(teacher_id, _months(date_debut, date_fin))
+    digest = hashlib.md5(':'.join(versions).encode()).hexdigest()
+    key = f"reporting:{kind}:{teacher_id or 'all'}:{date_debut}:{date_fin}:{digest}"
+
+    rows = cache.get(key)
+    if rows is None:
+        rows = compute(date_debut, date_fin)
+        cache.set(key, rows, getattr(settings, 'REPORTING_CACHE_TIMEOUT', 60 * 60 * 24))
+    return rows
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_reporting_bumps():
+    """
+    Regroupe les invalidations demandées pendant le bloc (suppression en masse :
+    une par séance) en un seul set_many à la sortie. Les formateurs et les mois
+    sont croisés : au pire quelques rapports de trop sont recalculés.
+    """
+    if getattr(_deferred, 'bumps', None) is not None:
+        yield  # bloc imbriqué : le bloc englobant invalide
+        return
+    _deferred.bumps = teacher_ids, dates = set(), set()
+    try:
+        yield
+    finally:
+        _deferred.bumps = None
+    bump_reporting_version(teacher_ids, dates)
+
+
+def bump_reporting_version(teacher_ids, dates):
+    """
+    Invalide les rapports des formateurs et des mois donnés, ainsi que le
+    rapport global (admin_reporting_list) de ces mois.
+    """
+    pending = getattr(_deferred, 'bumps', None)
+    if pending is not None:
+        pending[0].update(teacher_ids)
+        pending[1].update(dates)
+        return
+    months = {month_start(d) for d in dates if d}
+    tokens = {}
+    for month in months:
+        for teacher_id in {*(t for t in teacher_ids if t), None}:
+            tokens[_version_key(teacher_id, month)] = uuid.uuid4().hex
+    if tokens:
+        cache.set_many(tokens, timeout=None)
@@ -1,22 +1,72 @@
-from datetime import timedelta
-from dashboard.models import Session, SessionSeries
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, When, Window
+from django.db.models.functions import Coalesce, RowNumber, TruncMonth
+from django.utils import timezone
+from dashboard.models import (
+    MonthlyRollup, PaiementFormateur, Payment, Session, SessionSeries, Student,
+    completed_duration_sums, duration_sums_to_hours, rounded_session_hours,
+)
 
 
-def generate_series_occurrences(series: SessionSeries) -> list:
-    """Génère toutes les occurrences Session d'une SessionSeries."""
-    end = series.recurrence_end or (series.recurrence_start + timedelta(days=365))
-    current = series.recurrence_start
+def _series_dates(series: SessionSeries, until: date, after: date = None) -> list:
+    """
+    Occurrences (series_index, date) de la série jusqu'à until inclus, en ne gardant
+    que les dates postérieures à after. series_index est le rang de la semaine depuis
+    la première occurrence : il reste stable quel que soit le découpage de la génération.
+    """
+    first = series.recurrence_start
     # Avancer jusqu'au bon jour de semaine (0=lundi, Python weekday() convention)
-    days_ahead = (series.day_of_week - current.weekday()) % 7
-    current = current + timedelta(days=days_ahead)
-
-    sessions = []
+    days_ahead = (series.day_of_week - first.weekday()) % 7
+    first = first + timedelta(days=days_ahead)
     index = 0
-    while current <= end:
-        session = Session.objects.create(
-            teacher=series.teacher,
-            language=series.language,
-            date=current,
+    if after is not None and after >= first:
+        index = (after - first).days // 7 + 1
+    occurrences = []
+    current = first + timedelta(weeks=index)
+    while current <= until:
+        occurrences.append((index, current))
+        current += timedelta(weeks=1)
+        index += 1
+    return occurrences
+
+
+def series_horizon(series: SessionSeries, today: date = None) -> date:
+    """
+    Date jusqu'à laquelle les occurrences doivent exister : fin de série si
+    recurrence_end est renseignée, sinon SERIES_MATERIALIZATION_WEEKS semaines
+    après aujourd'hui (ou après le début de la série s'il est plus tard).
+    Une série sans recurrence_end n'a pas de durée maximale : son horizon
+    avance avec la date du jour.
+    """
+    if series.recurrence_end is not None:
+        return series.recurrence_end
+    today = today or timezone.localdate()
+    weeks = getattr(settings, 'SERIES_MATERIALIZATION_WEEKS', 8)
+    return max(today, series.recurrence_start) + timedelta(weeks=weeks)
+
+
+def generate_series_occurrences(series: SessionSeries, today: date = None) -> list:
+    """
+    Génère les occurrences Session d'une SessionSeries pas encore créées, jusqu'à
+    series_horizon(), en quelques requêtes : un bulk_create des séances, un
+    bulk_create des lignes étudiants (table M2M) et le recalcul groupé des
+    agrégats mensuels (bulk_create n'émet pas post_save).
+    """
+    until = series_horizon(series, today)
+    if series.materialized_until is not None and series.materialized_until >= until:
+        return []
+    occurrences = _series_dates(series, until, after=series.materialized_until)
+
+    sessions = [
+        Session(
+            teacher_id=series.teacher_id,
+            language_id=series.language_id,
+            date=day,
             start_time=series.start_time,
             end_time=series.end_time,
             type_seance=series.type_seance,
@@ -25,17 +75,106 @@ def generate_series_occurrences(series: SessionSeries) -> list:
             series=series,
             series_index=index,
         )
-        if series.students.exists():
-            session.students.set(series.students.all())
-        sessions.append(session)
-        current += timedelta(weeks=1)
-        index += 1
+        for index, day in occurrences
+    ]
+    with transaction.atomic():
+        if sessions:
+            sessions = Session.objects.bulk_create(sessions)
+            student_ids = list(series.students.values_list('pk', flat=True))
+            if student_ids:
+                through = Session.students.through
+                through.objects.bulk_create([
+                    through(session_id=session.pk, student_id=student_id)
+                    for session in sessions
+                    for student_id in student_ids
+                ])
+            refresh_session_rollups(occurrences[0][1], occurrences[-1][1])
+        SessionSeries.objects.filter(pk=series.pk).update(materialized_until=until)
+        series.materialized_until = until
     return sessions
 
 
+def extend_series_horizons(today: date = None) -> int:
+    """
+    Prolonge l'horizon glissant de toutes les séries sans recurrence_end
+    (cf. ensure_series_horizons et la commande extend_series_horizon). Renvoie
+    le nombre de séances créées.
+    """
+    created = 0
+    for series in SessionSeries.objects.filter(recurrence_end__isnull=True):
+        created += len(generate_series_occurrences(series, today=today))
+    return created
+
+
+# Dernier jour où ce processus a vérifié les horizons (cf. ensure_series_horizons)
+_horizons_checked = {'day': None}
+
+
+def ensure_series_horizons(today: date = None) -> int:
+    """
+    Prolonge les horizons glissants au premier appel de la journée : une fois
+    par processus, et une seule fois entre processus grâce au cache partagé.
+    Renvoie le nombre de séances créées.
+    """
+    today = today or timezone.localdate()
+    if _horizons_checked['day'] == today:
+        return 0
+    _horizons_checked['day'] = today
+    key = f'series_horizons:{today.isoformat()}'
+    if not cache.add(key, True, 60 * 60 * 48):
+        return 0
+    try:
+        return extend_series_horizons(today=today)
+    except Exception:
+        # Un autre appel de la journée pourra réessayer
+        cache.delete(key)
+        _horizons_checked['day'] = None
+        raise
+
+
+def virtual_series_occurrences(series_list, start: date, end: date) -> list:
+    """
+    Occurrences (series, series_index, date) pas encore matérialisées des séries
+    données dans la fenêtre [start, end], calculées depuis la règle de récurrence.
+    Une série sans recurrence_end n'est bornée que par la fenêtre.
+    """
+    occurrences = []
+    for series in series_list:
+        until = min(end, series.recurrence_end) if series.recurrence_end else end
+        after = series.materialized_until
+        if start > (after or date.min):
+            after = start - timedelta(days=1)
+        occurrences.extend(
+            (series, index, day) for index, day in _series_dates(series, until, after=after)
+        )
+    return occurrences
+
+
 _SCHEDULE_FIELDS = {'start_time', 'end_time', 'teacher', 'language', 'type_seance', 'meeting_link'}
 
 
+def _replace_series_students(sessions, students) -> None:
+    """
+    Remplace les étudiants de toutes les séances de sessions en deux requêtes
+    sur la table M2M (un DELETE, un INSERT groupé) au lieu d'un set() par séance.
+    N'émet pas m2m_changed : updated_at et le cache du reporting sont mis à jour ici.
+    """
+    from dashboard.reporting import bump_reporting_version
+
+    rows = list(sessions.values_list('pk', 'teacher_id', 'date'))
+    session_ids = [pk for pk, _, _ in rows]
+    student_ids = {getattr(student, 'pk', student) for student in students}
+    through = Session.students.through
+    through.objects.filter(session_id__in=session_ids).delete()
+    through.objects.bulk_create([
+        through(session_id=session_id, student_id=student_id)
+        for session_id in session_ids
+        for student_id in student_ids
+    ])
+    Session.objects.filter(pk__in=session_ids).update(updated_at=timezone.now())
+    bump_reporting_version({t for _, t, _ in rows}, {d for _, _, d in rows})
+
+
 def apply_series_edit(session: Session, scope: str, cleaned_data: dict):
     """
     scope: 'this' | 'this_and_future' | 'all'
@@ -58,23 +197,34 @@ def apply_series_edit(session: Session, scope: str, cleaned_data: dict):
             series=session.series,
             series_index__gte=session.series_index
         )
-        qs.update(**propagatable)
-        if students is not None:
-            for s in qs:
-                s.students.set(students)
-
     elif scope == 'all':
         qs = Session.objects.filter(series=session.series)
-        qs.update(**propagatable)
+    else:
+        return
+
+    with transaction.atomic():
+        # update() n'émet pas post_save : le reporting des formateurs (ancien et
+        # nouveau) est invalidé ici si le formateur change
+        if 'teacher' in propagatable:
+            from dashboard.reporting import bump_reporting_version
+
+            rows = list(qs.values_list('teacher_id', 'date'))
+            new_teacher = propagatable['teacher']
+            bump_reporting_version(
+                {t for t, _ in rows} | {getattr(new_teacher, 'pk', new_teacher)},
+                {d for _, d in rows},
+            )
+        qs.update(updated_at=timezone.now(), **propagatable)
         if students is not None:
-            for s in qs:
-                s.students.set(students)
-        # Update the series itself
+            _replace_series_students(qs, students)
+        # La série porte la règle des occurrences encore à générer (horizon glissant)
         series_obj = session.series
         for k, v in propagatable.items():
             if hasattr(series_obj, k):
                 setattr(series_obj, k, v)
         series_obj.save()
+        if students is not None:
+            series_obj.students.set(students)
 
 
 def apply_series_delete(session: Session, scope: str):
@@ -84,15 +234,436 @@ def apply_series_delete(session: Session, scope: str):
     if not session.series_id:
         session.delete()
         return
+    from dashboard.reporting import deferred_reporting_bumps
+
     if scope == 'this':
         session.delete()
     elif scope == 'this_and_future':
-        Session.objects.filter(
-            series=session.series,
-            series_index__gte=session.series_index
-        ).delete()
+        with transaction.atomic(), deferred_rollups(), deferred_reporting_bumps():
+            Session.objects.filter(
+                series=session.series,
+                series_index__gte=session.series_index
+            ).delete()
+            # La série s'arrête avant cette occurrence : l'horizon glissant ne la recrée pas
+            series_obj = session.series
+            series_obj.recurrence_end = session.date - timedelta(days=1)
+            series_obj.materialized_until = series_obj.recurrence_end
+            series_obj.save(update_fields=['recurrence_end', 'materialized_until', 'updated_at'])
     elif scope == 'all':
         series_obj = session.series
         series_pk = series_obj.pk
-        Session.objects.filter(series_id=series_pk).delete()
-        SessionSeries.objects.filter(pk=series_pk).delete()
+        with transaction.atomic(), deferred_rollups(), deferred_reporting_bumps():
+            Session.objects.filter(series_id=series_pk).delete()
+            SessionSeries.objects.filter(pk=series_pk).delete()
+
+
+# Nombre maximal de séances ramenées par statut pour le tableau de bord étudiant
+STUDENT_DASHBOARD_LIST_LIMIT = 10
+
+
+def get_student_dashboard_data(student, today=None) -> dict:
+    """
+    Données du tableau de bord étudiant en deux requêtes :
+    - un agrégat conditionnel pour les compteurs et les heures consommées ;
+    - une requête fenêtrée (ROW_NUMBER par statut) pour les listes de séances.
+    """
+    today = today or timezone.now().date()
+    sessions = Session.objects.filter(students=student)
+
+    counters = sessions.aggregate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(status='completed')),
+        **completed_duration_sums(),
+    )
+    hours_used = duration_sums_to_hours(counters['completed_minutes'], counters['completed_span'])
+
+    # Séances prévues : les plus proches d'abord ; autres statuts : les plus récentes d'abord.
+    is_scheduled = Q(status='scheduled')
+    rows = list(
+        sessions.filter(
+            Q(status__in=['completed', 'rescheduled'])
+            | Q(date=today)
+            | (is_scheduled & Q(date__gte=today))
+        )
+        .select_related('language', 'teacher__user')
+        .annotate(status_rank=Window(
+            RowNumber(),
+            partition_by=[F('status')],
+            order_by=[
+                Case(When(is_scheduled, then=F('date'))).asc(),
+                Case(When(is_scheduled, then=F('start_time'))).asc(),
+                F('date').desc(),
+                F('start_time').desc(),
+            ],
+        ))
+        .filter(status_rank__lte=STUDENT_DASHBOARD_LIST_LIMIT)
+        .order_by('status', 'status_rank')
+    )
+
+    upcoming = [s for s in rows if s.status == 'scheduled' and s.date >= today]
+    return {
+        'total_sessions': counters['total'],
+        'completed_sessions_count': counters['completed'],
+        'total_hours_used': hours_used,
+        'hours_remaining': student.total_hours_purchased - hours_used,
+        'upcoming_sessions': upcoming,
+        'next_session': upcoming[0] if upcoming else None,
+        'completed_sessions': [s for s in rows if s.status == 'completed'],
+        'rescheduled_sessions': [s for s in rows if s.status == 'rescheduled'][:5],
+        'today_sessions': sorted(
+            (s for s in rows if s.date == today), key=lambda s: s.start_time
+        ),
+    }
+
+
+def get_teacher_dashboard_stats(teacher, languages, today=None) -> dict:
+    """
+    Statistiques du tableau de bord formateur en deux requêtes :
+    - séances groupées par langue (total, terminées, aujourd'hui, 7 prochains jours) ;
+    - comptage conditionnel des étudiants (total et par langue).
+    """
+    today = today or timezone.now().date()
+    end_of_week = today + timedelta(days=7)
+
+    by_language = {
+        row['language']: row
+        for row in Session.objects.filter(teacher=teacher)
+        .order_by()
+        .values('language')
+        .annotate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            today=Count('id', filter=Q(date=today)),
+            week=Count('id', filter=Q(date__gte=today, date__lte=end_of_week)),
+        )
+    }
+
+    student_counts = Student.objects.filter(current_teachers=teacher).aggregate(
+        total=Count('id', distinct=True),
+        **{
+            f'lang_{language.pk}': Count('id', filter=Q(languages=language), distinct=True)
+            for language in languages
+        },
+    )
+
+    language_stats = []
+    for language in languages:
+        row = by_language.get(language.pk, {})
+        sessions_count = row.get('total', 0)
+        completed_count = row.get('completed', 0)
+        language_stats.append({
+            'language': language,
+            'total_sessions': sessions_count,
+            'completed_sessions': completed_count,
+            'students_count': student_counts[f'lang_{language.pk}'],
+            'completion_rate': (
+                (completed_count / sessions_count * 100) if sessions_count > 0 else 0
+            ),
+        })
+
+    return {
+        'language_stats': language_stats,
+        'total_students': student_counts['total'],
+        'sessions_today_count': sum(row['today'] for row in by_language.values()),
+        'sessions_week_count': sum(row['week'] for row in by_language.values()),
+    }
+
+
+# ─────────────────────────────────────────────────────────────
+#  AGRÉGATS MENSUELS (MonthlyRollup)
+# ─────────────────────────────────────────────────────────────
+
+ROLLUP_SOURCES = ('sessions', 'payments', 'students', 'payouts')
+
+
+def month_start(value) -> date:
+    """Premier jour du mois de value (date, datetime ou chaîne ISO)."""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        value = value.date()
+    elif not isinstance(value, date):
+        value = date.fromisoformat(str(value)[:10])
+    return value.replace(day=1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _rollup_sessions(first, last):
+    counts = dict(
+        Session.objects.filter(date__gte=first, date__lt=last)
+        .order_by()
+        .values_list('status')
+        .annotate(n=Count('id'))
+    )
+    return {f'sessions_{status}': counts.get(status, 0) for status, _ in Session.STATUS_CHOICES}
+
+
+def _rollup_payments(first, last):
+    total = Payment.objects.filter(
+        status='paid', payment_date__date__gte=first, payment_date__date__lt=last
+    ).aggregate(total=Sum('amount'))['total']
+    return {'revenue': total or 0}
+
+
+def _rollup_students(first, last):
+    return {
+        'new_students': Student.objects.filter(
+            date_joined__gte=first, date_joined__lt=last
+        ).count()
+    }
+
+
+def _rollup_payouts(first, last):
+    total = PaiementFormateur.objects.filter(statut='paye').annotate(
+        paid_on=Coalesce('date_paiement', 'periode_fin')
+    ).filter(paid_on__gte=first, paid_on__lt=last).aggregate(total=Sum('montant'))['total']
+    return {'teacher_payouts': total or 0}
+
+
+_ROLLUP_COMPUTERS = {
+    'sessions': _rollup_sessions,
+    'payments': _rollup_payments,
+    'students': _rollup_students,
+    'payouts': _rollup_payouts,
+}
+
+
+def refresh_monthly_rollup(month, sources=ROLLUP_SOURCES) -> None:
+    """
+    Recalcule la ligne MonthlyRollup d'un mois depuis les tables sources.
+    sources limite le recalcul aux colonnes touchées (ex. ('sessions',) après
+    un changement de statut) ; une ligne nouvellement créée est toujours complète.
+    """
+    first = month_start(month)
+    last = add_months(first, 1)
+    rollup, created = MonthlyRollup.objects.get_or_create(month=first)
+    if created:
+        sources = ROLLUP_SOURCES
+    values = {}
+    for source in sources:
+        values.update(_ROLLUP_COMPUTERS[source](first, last))
+    MonthlyRollup.objects.filter(pk=rollup.pk).update(updated_at=timezone.now(), **values)
+
+
+_deferred = threading.local()
+
+
+def schedule_monthly_rollup(month, sources=ROLLUP_SOURCES) -> None:
+    """
+    Point d'entrée des signaux : recalcul immédiat, ou regroupé à la sortie
+    d'un bloc deferred_rollups() (suppression ou écriture en masse).
+    """
+    pending = getattr(_deferred, 'rollups', None)
+    if pending is None:
+        refresh_monthly_rollup(month, sources=sources)
+    else:
+        pending.update((month_start(month), source) for source in sources)
+
+
+@contextmanager
+def deferred_rollups():
+    """
+    Regroupe les recalculs MonthlyRollup demandés pendant le bloc : les colonnes
+    sessions_* de tous les mois touchés en une requête groupée
+    (refresh_session_rollups), les autres sources une fois par mois.
+    Rien n'est recalculé si le bloc lève une exception.
+    """
+    if getattr(_deferred, 'rollups', None) is not None:
+        yield  # bloc imbriqué : le bloc englobant recalcule
+        return
+    _deferred.rollups = pending = set()
+    try:
+        yield
+    finally:
+        _deferred.rollups = None
+
+    session_months = sorted(month for month, source in pending if source == 'sessions')
+    if session_months:
+        refresh_session_rollups(session_months[0], session_months[-1])
+    other = {}
+    for month, source in pending:
+        if source != 'sessions':
+            other.setdefault(month, []).append(source)
+    for month, sources in sorted(other.items()):
+        refresh_monthly_rollup(month, sources=tuple(sources))
+
+
+def refresh_session_rollups(first_day, last_day) -> None:
+    """
+    Recalcule les colonnes sessions_* des mois [first_day, last_day] déjà présents
+    dans MonthlyRollup : une requête groupée et un bulk_update. Les mois absents
+    seront calculés à leur première lecture (get_monthly_rollups).
+    À appeler après une écriture en masse de séances, qui n'émet pas post_save.
+    """
+    first, last = month_start(first_day), add_months(month_start(last_day), 1)
+    rollups = list(MonthlyRollup.objects.filter(month__gte=first, month__lt=last))
+    if not rollups:
+        return
+    counts = {
+        (month, status): n
+        for month, status, n in Session.objects.filter(date__gte=first, date__lt=last)
+        .annotate(m=TruncMonth('date'))
+        .order_by()
+        .values_list('m', 'status')
+        .annotate(n=Count('id'))
+    }
+    fields = [f'sessions_{status}' for status, _ in Session.STATUS_CHOICES]
+    now = timezone.now()
+    for rollup in rollups:
+        for status, _ in Session.STATUS_CHOICES:
+            setattr(rollup, f'sessions_{status}', counts.get((rollup.month, status), 0))
+        rollup.updated_at = now
+    MonthlyRollup.objects.bulk_update(rollups, [*fields, 'updated_at'])
+
+
+def _compute_rollups(first=None, last=None) -> dict:
+    """
+    Calcule (sans les enregistrer) les lignes MonthlyRollup des mois [first, last[,
+    ou de tout l'historique, avec une requête groupée par mois et par source.
+    """
+    rows = {}
+
+    def row(month):
+        month = month_start(month)
+        return rows.setdefault(month, MonthlyRollup(month=month))
+
+    def in_range(field):
+        bounds = {}
+        if first is not None:
+            bounds[f'{field}__gte'] = first
+        if last is not None:
+            bounds[f'{field}__lt'] = last
+        return bounds
+
+    sessions = (
+        Session.objects.filter(**in_range('date'))
+        .annotate(m=TruncMonth('date'))
+        .order_by()
+        .values_list('m', 'status')
+        .annotate(n=Count('id'))
+    )
+    for month, status, n in sessions:
+        setattr(row(month), f'sessions_{status}', n)
+
+    revenue = (
+        Payment.objects.filter(status='paid', **in_range('payment_date__date'))
+        .annotate(m=TruncMonth('payment_date'))
+        .order_by()
+        .values_list('m')
+        .annotate(total=Sum('amount'))
+    )
+    for month, total in revenue:
+        row(month).revenue = total
+
+    new_students = (
+        Student.objects.filter(**in_range('date_joined'))
+        .annotate(m=TruncMonth('date_joined'))
+        .order_by()
+        .values_list('m')
+        .annotate(n=Count('id'))
+    )
+    for month, n in new_students:
+        row(month).new_students = n
+
+    payouts = (
+        PaiementFormateur.objects.filter(statut='paye')
+        .annotate(paid_on=Coalesce('date_paiement', 'periode_fin'))
+        .filter(**in_range('paid_on'))
+        .annotate(m=TruncMonth('paid_on'))
+        .order_by()
+        .values_list('m')
+        .annotate(total=Sum('montant'))
+    )
+    for month, total in payouts:
+        row(month).teacher_payouts = total
+
+    return rows
+
+
+def rebuild_monthly_rollups() -> int:
+    """Reconstruit toute la table MonthlyRollup avec une requête groupée par source."""
+    rows = _compute_rollups()
+    with transaction.atomic():
+        MonthlyRollup.objects.all().delete()
+        MonthlyRollup.objects.bulk_create(rows.values())
+    return len(rows)
+
+
+def get_monthly_rollups(first_month, count) -> list:
+    """
+    count lignes MonthlyRollup consécutives à partir de first_month (une lecture indexée).
+    Les mois absents de la table sont calculés en bloc puis stockés au premier accès.
+    """
+    first = month_start(first_month)
+    months = [add_months(first, i) for i in range(count)]
+    rollups = {
+        r.month: r
+        for r in MonthlyRollup.objects.filter(month__gte=months[0], month__lte=months[-1])
+    }
+    missing = [m for m in months if m not in rollups]
+    if missing:
+        computed = _compute_rollups(missing[0], add_months(missing[-1], 1))
+        new_rows = [computed.get(m) or MonthlyRollup(month=m) for m in missing]
+        MonthlyRollup.objects.bulk_create(new_rows, ignore_conflicts=True)
+        rollups.update((r.month, r) for r in new_rows)
+    return [rollups[m] for m in months]
+
+
+# ─────────────────────────────────────────────────────────────
+#  HEURES ÉTUDIANTS (contrôle des compteurs dénormalisés)
+# ─────────────────────────────────────────────────────────────
+
+def reconcile_student_hours(fix: bool = False) -> list:
+    """
+    Compare total_hours_purchased / total_hours_used de tous les étudiants à leurs
+    sources : paiements payés (requête annotée) et séances terminées, comptées
+    séance par séance avec rounded_session_hours comme le signal de fin de séance
+    (une requête sur la table M2M). Renvoie les écarts [(student, champ, stocké,
+    attendu)] ; fix=True les corrige avec un bulk_update.
+    """
+    used = {}
+    rows = (
+        Session.students.through.objects.filter(session__status='completed')
+        .select_related('session')
+        .only('student_id', 'session__date', 'session__start_time',
+              'session__end_time', 'session__duree_minutes')
+    )
+    for row in rows.iterator(chunk_size=2000):
+        used[row.student_id] = used.get(row.student_id, 0) + rounded_session_hours(row.session.duration_hours)
+
+    paid_hours = (
+        Payment.objects.filter(student=OuterRef('pk'), status='paid')
+        .order_by()
+        .values('student')
+        .annotate(total=Sum('hours_purchased'))
+        .values('total')
+    )
+    students = (
+        Student.objects.annotate(paid_hours=Coalesce(Subquery(paid_hours), 0))
+        .select_related('user')
+        .order_by('pk')
+    )
+    mismatches, to_fix = [], []
+    for student in students.iterator(chunk_size=500):
+        expected = {
+            'total_hours_purchased': student.paid_hours,
+            'total_hours_used': used.get(student.pk, 0),
+        }
+        dirty = False
+        for field, value in expected.items():
+            stored = getattr(student, field) or 0
+            if stored != value:
+                mismatches.append((student, field, stored, value))
+                setattr(student, field, value)
+                dirty = True
+        if dirty:
+            to_fix.append(student)
+    if fix and to_fix:
+        Student.objects.bulk_update(
+            to_fix, ['total_hours_purchased', 'total_hours_used'], batch_size=500
+        )
+    return mismatches
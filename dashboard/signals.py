@@ -1,8 +1,12 @@
-from django.db.models.signals import post_save, pre_save, post_delete
+from django.db.models.signals import m2m_changed, post_save, pre_save, post_delete
 from django.dispatch import receiver
 import logging
-from django.db.models import Sum, F
-from .models import CustomUser, Student, Teacher, Session, Payment, Notification
+from django.utils import timezone
+from django.db.models import F
+from .models import CustomUser, Student, Teacher, Session, Payment, Notification, PaiementFormateur, rounded_session_hours
+from .services import month_start, schedule_monthly_rollup
+from .reporting import REPORTING_FIELDS, bump_reporting_version
+from .notifications import invalidate_unread, notify
 
 logger = logging.getLogger(__name__)
 
@@ -24,60 +28,203 @@ def sync_user_role(sender, instance, **kwargs):
 
 @receiver(pre_save, sender=Session)
 def store_old_session_status(sender, instance, **kwargs):
-    if instance.pk:
-        instance._old_status = Session.objects.filter(
-            pk=instance.pk
-        ).values_list('status', flat=True).first()
-    else:
-        instance._old_status = None
+    """Statut et date avant sauvegarde, lus dans l'état chargé (Session.from_db) : pas de requête."""
+    instance._old_status, instance._old_date = instance.previous_values('status', 'date') or (None, None)
 
 
 @receiver(post_save, sender=Session)
-def handle_session_completed(sender, instance, **kwargs):
-    if instance._old_status != 'completed' and instance.status == 'completed':
-        hours = instance.duration_hours
-        for student in instance.students.select_related('user').all():
-            # Déduire les heures utilisées
-            Student.objects.filter(pk=student.pk).update(
-                total_hours_used=F('total_hours_used') + hours
-            )
-            # Notifier l'étudiant
-            already_notified = Notification.objects.filter(
-                user=student.user,
-                notification_type='evaluation_request',
-                message__contains=f"Session {instance.id}"
-            ).exists()
-            if not already_notified:
-                Notification.objects.create(
-                    user=student.user,
-                    notification_type='evaluation_request',
-                    title="Votre cours est terminé — donnez votre avis",
-                    message=(
-                        f"Votre séance de {instance.language} avec "
-                        f"{instance.teacher} du {instance.date} est terminée. "
-                        f"Session {instance.id} — Cliquez pour évaluer."
-                    ),
-                )
-            logger.info(f"Notification évaluation créée pour {student} (Session {instance.id})")
+def handle_session_completed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    if instance._old_status == 'completed' or instance.status != 'completed':
+        return
+    students = list(instance.students.values_list('pk', 'user_id'))
+    if not students:
+        return
+    # Déduire les heures utilisées : un seul UPDATE pour tous les étudiants
+    Student.objects.filter(pk__in=[pk for pk, _ in students]).update(
+        total_hours_used=F('total_hours_used') + rounded_session_hours(instance.duration_hours)
+    )
+    # Notifier les étudiants : un seul INSERT, doublons écartés par la contrainte (séance, utilisateur, type)
+    notify(
+        [user_id for _, user_id in students],
+        notification_type='evaluation_request',
+        title="Votre cours est terminé — donnez votre avis",
+        message=(
+            f"Votre séance de {instance.language} avec "
+            f"{instance.teacher} du {instance.date} est terminée. "
+            f"Session {instance.id} — Cliquez pour évaluer."
+        ),
+        session=instance,
+    )
+    logger.info(f"Notifications évaluation créées pour {len(students)} étudiant(s) (Session {instance.id})")
+
+
+def _paid_hours(status, hours):
+    return (hours or 0) if status == 'paid' else 0
+
+
+def _add_purchased_hours(student_id, delta):
+    if student_id and delta:
+        Student.objects.filter(pk=student_id).update(
+            total_hours_purchased=F('total_hours_purchased') + delta
+        )
+
+
+@receiver(pre_save, sender=Payment)
+def store_old_payment_hours(sender, instance, **kwargs):
+    instance._old_hours = instance.previous_values('student_id', 'status', 'hours_purchased')
 
 
 @receiver(post_save, sender=Payment)
 def update_student_hours_on_payment(sender, instance, created, **kwargs):
-    if instance.status == 'paid':
-        student = instance.student
-        total_purchased = Payment.objects.filter(
-            student=student, status='paid'
-        ).aggregate(total=Sum('hours_purchased'))['total'] or 0
-        student.total_hours_purchased = total_purchased
-        student.save(update_fields=['total_hours_purchased'])
+    """
+    Met à jour total_hours_purchased par différence (ancien / nouveau paiement),
+    sans ré-agréger tous les paiements de l'étudiant. Aucune requête si ni le
+    statut, ni les heures, ni l'étudiant n'ont changé.
+    Voir la commande reconcile_student_hours pour le contrôle global.
+    """
+    old_student, old_status, old_hours = instance._old_hours or (None, None, 0)
+    old_paid = _paid_hours(old_status, old_hours)
+    new_paid = _paid_hours(instance.status, instance.hours_purchased)
+    if old_student == instance.student_id:
+        _add_purchased_hours(instance.student_id, new_paid - old_paid)
+    else:
+        _add_purchased_hours(old_student, -old_paid)
+        _add_purchased_hours(instance.student_id, new_paid)
 
 
 @receiver(post_delete, sender=Payment)
 def update_student_hours_on_payment_delete(sender, instance, **kwargs):
-    if instance.status == 'paid':
-        student = instance.student
-        total_purchased = Payment.objects.filter(
-            student=student, status='paid'
-        ).aggregate(total=Sum('hours_purchased'))['total'] or 0
-        student.total_hours_purchased = total_purchased
-        student.save(update_fields=['total_hours_purchased'])
+    _add_purchased_hours(instance.student_id, -_paid_hours(instance.status, instance.hours_purchased))
+
+
+# ── Agrégats mensuels (MonthlyRollup) ───────────────────────
+
+@receiver(post_save, sender=Session)
+def refresh_rollup_on_session_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not {'status', 'date'}.intersection(update_fields):
+        return
+    months = {month_start(instance.date)}
+    if instance._old_date is not None:
+        months.add(month_start(instance._old_date))
+    if not created and instance._old_status == instance.status and len(months) == 1:
+        return
+    for month in months:
+        schedule_monthly_rollup(month, sources=('sessions',))
+
+
+@receiver(post_delete, sender=Session)
+def refresh_rollup_on_session_delete(sender, instance, **kwargs):
+    schedule_monthly_rollup(instance.date, sources=('sessions',))
+
+
+# Champs qui rattachent la ligne à un mois (le premier renseigné l'emporte)
+_ROLLUP_DATE_FIELDS = {
+    Payment: ('payment_date',),
+    Student: ('date_joined',),
+    PaiementFormateur: ('date_paiement', 'periode_fin'),
+}
+
+
+def _rollup_date(values):
+    return next((value for value in values if value), None)
+
+
+@receiver(pre_save, sender=Payment)
+@receiver(pre_save, sender=Student)
+@receiver(pre_save, sender=PaiementFormateur)
+def store_old_rollup_date(sender, instance, update_fields=None, **kwargs):
+    """Date de rattachement avant sauvegarde (état chargé) : l'ancien mois est aussi recalculé."""
+    fields = _ROLLUP_DATE_FIELDS[sender]
+    if update_fields is not None and not set(fields).intersection(update_fields):
+        instance._old_rollup_date = None
+        return
+    instance._old_rollup_date = _rollup_date(instance.previous_values(*fields) or ())
+
+
+def _schedule_rollup(instance, source):
+    new = _rollup_date(getattr(instance, f) for f in _ROLLUP_DATE_FIELDS[type(instance)])
+    old, instance._old_rollup_date = getattr(instance, '_old_rollup_date', None), None
+    for month in {month_start(day) for day in (new, old) if day}:
+        schedule_monthly_rollup(month, sources=(source,))
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def refresh_rollup_on_payment_change(sender, instance, **kwargs):
+    _schedule_rollup(instance, 'payments')
+
+
+@receiver(post_save, sender=Student)
+def refresh_rollup_on_student_save(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or 'date_joined' in update_fields:
+        _schedule_rollup(instance, 'students')
+
+
+@receiver(post_delete, sender=Student)
+def refresh_rollup_on_student_delete(sender, instance, **kwargs):
+    schedule_monthly_rollup(instance.date_joined, sources=('students',))
+
+
+@receiver(post_save, sender=PaiementFormateur)
+@receiver(post_delete, sender=PaiementFormateur)
+def refresh_rollup_on_payout_change(sender, instance, **kwargs):
+    _schedule_rollup(instance, 'payouts')
+
+
+@receiver(m2m_changed, sender=Session.students.through)
+def touch_session_on_students_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Un changement d'étudiants modifie updated_at (ETag du flux calendrier)."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        Session.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+    elif pk_set:
+        Session.objects.filter(pk__in=pk_set).update(updated_at=timezone.now())
+
+
+# ── Cache du reporting ──────────────────────────────────────
+
+@receiver(post_save, sender=Session)
+def invalidate_reporting_on_session_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not REPORTING_FIELDS.intersection(update_fields):
+        return
+    if not REPORTING_FIELDS.intersection(instance.changed_fields()):
+        return
+    bump_reporting_version(
+        [instance.teacher_id, instance.loaded_value('teacher_id')],
+        [instance.date, instance._old_date],
+    )
+
+
+@receiver(post_delete, sender=Session)
+def invalidate_reporting_on_session_delete(sender, instance, **kwargs):
+    bump_reporting_version([instance.teacher_id], [instance.date])
+
+
+@receiver(m2m_changed, sender=Session.students.through)
+def invalidate_reporting_on_students_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        bump_reporting_version([instance.teacher_id], [instance.date])
+    elif pk_set:
+        rows = list(Session.objects.filter(pk__in=pk_set).values_list('teacher_id', 'date'))
+        bump_reporting_version([t for t, _ in rows], [d for _, d in rows])
+
+
+# ── Compteur de notifications non lues ──────────────────────
+# Pas de receiver post_delete sur Notification : il désactiverait la suppression
+# rapide (un seul DELETE) des suppressions groupées. Notification.delete() et les
+# suppressions groupées (apply_bulk_action, admin) invalident eux-mêmes le compteur.
+
+@receiver(post_save, sender=Notification)
+def invalidate_unread_on_notification_change(sender, instance, **kwargs):
+    invalidate_unread([instance.user_id])
+
+
+@receiver(post_delete, sender=CustomUser)
+def invalidate_unread_on_user_delete(sender, instance, **kwargs):
+    """Les notifications de l'utilisateur partent en cascade, sans signal."""
+    invalidate_unread([instance.pk])
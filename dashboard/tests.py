@@ -1,4 +1,6 @@
+import json
 from django.test import TestCase, Client
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from dashboard.models import Student, Teacher, Session, Language, Notification, CustomUser
 
@@ -44,6 +46,24 @@ class StudentHoursTest(TestCase):
     def test_hours_remaining(self):
         self.assertAlmostEqual(self.student.hours_remaining, 9.0, places=1)
 
+    def test_with_hours_annotation(self):
+        self.session.duree_minutes = 90
+        self.session.save()
+        other = Student.objects.get(user=make_user('student2b', 'student'))
+        with self.assertNumQueries(1):
+            students = {s.pk: s for s in Student.objects.with_hours()}
+            self.assertEqual(students[self.student.pk].computed_hours_used, 1.5)
+            self.assertEqual(students[self.student.pk].hours_remaining, 8.5)
+            self.assertEqual(students[other.pk].computed_hours_used, 0)
+
+    def test_with_hours_combined_with_joined_annotations(self):
+        from django.db.models import Count
+        student = Student.objects.with_hours().annotate(
+            nb_languages=Count('languages'), nb_sessions=Count('sessions'),
+        ).get(pk=self.student.pk)
+        self.assertEqual(student.nb_sessions, 1)
+        self.assertAlmostEqual(student.computed_hours_used, 1.0, places=1)
+
 
 class SessionNotificationSignalTest(TestCase):
     def setUp(self):
@@ -127,7 +147,7 @@ class ReportingAccessTest(TestCase):
 
 from dashboard.models import SessionSeries
 from dashboard.services import generate_series_occurrences, apply_series_edit, apply_series_delete
-from datetime import date, time
+from datetime import date, time, timedelta
 
 
 class SessionSeriesServiceTest(TestCase):
@@ -280,3 +300,1205 @@ class AdminSessionSeriesViewTest(TestCase):
         self.assertRedirects(response, reverse('admin_sessions_list'))
         self.assertEqual(SessionSeries.objects.count(), 1)
         self.assertEqual(Session.objects.filter(series__isnull=False).count(), 4)
+
+
+class StudentDashboardDataTest(TestCase):
+    def setUp(self):
+        from dashboard.models import Student
+        self.teacher = Teacher.objects.get(user=make_user('teacher_dd', 'teacher'))
+        self.student = Student.objects.get(user=make_user('student_dd', 'student'))
+        self.student.total_hours_purchased = 20
+        self.student.save()
+        self.lang = Language.objects.create(name='Italien', code='it')
+        self.today = date(2026, 6, 10)
+
+    def _session(self, day, status, start=time(10, 0), end=time(11, 0), minutes=None):
+        s = Session.objects.create(
+            teacher=self.teacher, language=self.lang, date=day,
+            start_time=start, end_time=end, status=status, duree_minutes=minutes,
+        )
+        s.students.add(self.student)
+        return s
+
+    def test_counters_and_lists(self):
+        from datetime import timedelta
+        from dashboard.services import get_student_dashboard_data
+        for i in range(12):
+            self._session(self.today - timedelta(days=i + 1), 'completed')
+        self._session(self.today - timedelta(days=30), 'completed', minutes=90)
+        self._session(self.today - timedelta(days=2), 'rescheduled')
+        later = self._session(self.today + timedelta(days=3), 'scheduled')
+        soon = self._session(self.today, 'scheduled', start=time(16, 0), end=time(17, 0))
+        self._session(self.today - timedelta(days=5), 'scheduled')  # passée, non close
+
+        with self.assertNumQueries(2):
+            data = get_student_dashboard_data(self.student, today=self.today)
+
+        self.assertEqual(data['total_sessions'], 17)
+        self.assertEqual(data['completed_sessions_count'], 13)
+        self.assertEqual(data['total_hours_used'], 13.5)
+        self.assertEqual(data['hours_remaining'], 6.5)
+        self.assertEqual(len(data['completed_sessions']), 10)
+        self.assertEqual(data['completed_sessions'][0].date, self.today - timedelta(days=1))
+        self.assertEqual(len(data['rescheduled_sessions']), 1)
+        self.assertEqual(data['upcoming_sessions'], [soon, later])
+        self.assertEqual(data['next_session'], soon)
+        self.assertEqual(data['today_sessions'], [soon])
+
+    def test_dashboard_view_uses_loader(self):
+        self._session(self.today, 'completed')
+        client = Client()
+        client.login(username='student_dd', password='pass')
+        r = client.get('/')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.context['total_sessions'], 1)
+        self.assertEqual(r.context['hours_remaining'], 19.0)
+
+
+class TeacherDashboardStatsTest(TestCase):
+    def setUp(self):
+        self.teacher = Teacher.objects.get(user=make_user('teacher_ds', 'teacher'))
+        self.en = Language.objects.create(name='Anglais', code='en')
+        self.de = Language.objects.create(name='Allemand', code='de')
+        self.pt = Language.objects.create(name='Portugais', code='pt')
+        self.teacher.languages.add(self.en, self.de, self.pt)
+        for i, lang in enumerate([self.en, self.en, self.de]):
+            student = Student.objects.get(user=make_user(f'student_ds{i}', 'student'))
+            student.languages.add(lang)
+            student.current_teachers.add(self.teacher)
+        self.today = date(2026, 6, 10)
+        for day, status, lang in [
+            (self.today, 'scheduled', self.en),
+            (date(2026, 6, 12), 'scheduled', self.en),
+            (date(2026, 5, 1), 'completed', self.en),
+            (date(2026, 5, 2), 'completed', self.de),
+        ]:
+            Session.objects.create(
+                teacher=self.teacher, language=lang, date=day,
+                start_time=time(10, 0), end_time=time(11, 0), status=status,
+            )
+
+    def test_stats_in_two_queries(self):
+        from dashboard.services import get_teacher_dashboard_stats
+        languages = list(self.teacher.languages.order_by('code'))
+        with self.assertNumQueries(2):
+            stats = get_teacher_dashboard_stats(self.teacher, languages, today=self.today)
+        by_code = {row['language'].code: row for row in stats['language_stats']}
+        self.assertEqual(by_code['en']['total_sessions'], 3)
+        self.assertEqual(by_code['en']['completed_sessions'], 1)
+        self.assertEqual(by_code['en']['students_count'], 2)
+        self.assertEqual(by_code['de']['completion_rate'], 100)
+        self.assertEqual(by_code['pt']['total_sessions'], 0)
+        self.assertEqual(by_code['pt']['students_count'], 0)
+        self.assertEqual(stats['total_students'], 3)
+        self.assertEqual(stats['sessions_today_count'], 1)
+        self.assertEqual(stats['sessions_week_count'], 2)
+
+    def test_teacher_view_renders(self):
+        client = Client()
+        client.login(username='teacher_ds', password='pass')
+        r = client.get('/teacher/teacher_ds/')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.context['language_stats']), 3)
+
+
+class MonthlyRollupTest(TestCase):
+    def setUp(self):
+        self.teacher = Teacher.objects.get(user=make_user('teacher_mr', 'teacher'))
+        self.lang = Language.objects.create(name='Russe', code='ru')
+
+    def _session(self, day, status='scheduled'):
+        return Session.objects.create(
+            teacher=self.teacher, language=self.lang, date=day,
+            start_time=time(10, 0), end_time=time(11, 0), status=status,
+        )
+
+    def test_signals_keep_rollup_in_sync(self):
+        from dashboard.models import MonthlyRollup
+        session = self._session(date(2026, 3, 10))
+        self._session(date(2026, 3, 20), status='completed')
+        march = MonthlyRollup.objects.get(month=date(2026, 3, 1))
+        self.assertEqual((march.sessions_scheduled, march.sessions_completed), (1, 1))
+
+        session.date = date(2026, 4, 2)
+        session.status = 'completed'
+        session.save()
+        march.refresh_from_db()
+        april = MonthlyRollup.objects.get(month=date(2026, 4, 1))
+        self.assertEqual((march.sessions_scheduled, march.sessions_completed), (0, 1))
+        self.assertEqual(april.sessions_completed, 1)
+
+        session.delete()
+        april.refresh_from_db()
+        self.assertEqual(april.sessions_completed, 0)
+
+    def test_moving_dates_refreshes_both_months(self):
+        from datetime import datetime
+        from django.utils import timezone
+        from dashboard.models import MonthlyRollup, PaiementFormateur, Payment
+        from dashboard.services import month_start
+
+        def rollup(month):
+            return MonthlyRollup.objects.get(month=month)
+
+        student = Student.objects.get(user=make_user('student_mr', 'student'))
+        march, april = date(2026, 3, 1), date(2026, 4, 1)
+        # payment_date est auto_now_add : le paiement est d'abord daté du mois courant
+        payment = Payment.objects.create(
+            student=student, amount=100, hours_purchased=10, hours_remaining=10,
+            payment_type='package', languages=self.lang, status='paid', invoice_number='INV-MR',
+        )
+        created_month = month_start(payment.payment_date)
+        self.assertEqual(rollup(created_month).revenue, 100)
+        payment = Payment.objects.get(pk=payment.pk)
+        payment.payment_date = timezone.make_aware(datetime(2026, 3, 15, 12, 0))
+        payment.save()
+        self.assertEqual((rollup(created_month).revenue, rollup(march).revenue), (0, 100))
+
+        payout = PaiementFormateur.objects.create(
+            formateur=self.teacher, periode_debut=date(2026, 3, 1), periode_fin=date(2026, 3, 31),
+            montant=50, statut='paye', date_paiement=date(2026, 3, 31),
+        )
+        payout = PaiementFormateur.objects.get(pk=payout.pk)
+        payout.date_paiement = date(2026, 4, 5)
+        payout.save()
+        self.assertEqual((rollup(march).teacher_payouts, rollup(april).teacher_payouts), (0, 50))
+
+        student = Student.objects.get(pk=student.pk)
+        joined = month_start(student.date_joined)
+        student.date_joined = date(2025, 12, 24)
+        student.save()
+        self.assertEqual(rollup(date(2025, 12, 1)).new_students, 1)
+        self.assertEqual(rollup(joined).new_students, 0)
+
+    def test_rebuild_matches_incremental(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from dashboard.models import MonthlyRollup
+        from dashboard.services import get_monthly_rollups
+        for day in (date(2026, 1, 5), date(2026, 2, 5), date(2026, 2, 6)):
+            self._session(day, status='completed')
+        incremental = [(r.month, r.sessions_completed) for r in get_monthly_rollups(date(2026, 1, 1), 3)]
+        call_command('rebuild_monthly_rollup', stdout=StringIO())
+        with self.assertNumQueries(1):
+            rebuilt = [(r.month, r.sessions_completed) for r in get_monthly_rollups(date(2026, 1, 1), 2)]
+        self.assertEqual(rebuilt, incremental[:2])
+        self.assertEqual(incremental[1], (date(2026, 2, 1), 2))
+        self.assertFalse(MonthlyRollup.objects.filter(month=date(2026, 3, 1)).exists())
+
+    def test_admin_dashboard_horizon(self):
+        make_user('admin_mr', 'admin')
+        client = Client()
+        client.login(username='admin_mr', password='pass')
+        r = client.get('/administrateur/?mois=24')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(json.loads(r.context['sessions_labels'])), 24)
+
+
+class PastThenFutureSessionsTest(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        self.teacher = Teacher.objects.get(user=make_user('teacher_pf', 'teacher'))
+        lang = Language.objects.create(name='Chinois', code='zh')
+        self.today = date(2026, 6, 10)
+        for offset in range(-6, 6):
+            Session.objects.create(
+                teacher=self.teacher, language=lang, date=self.today + timedelta(days=offset),
+                start_time=time(10, 0), end_time=time(11, 0),
+            )
+
+    def test_pages_keep_past_desc_then_future_asc(self):
+        from datetime import timedelta
+        from django.core.paginator import Paginator
+        from dashboard.pagination import PastThenFutureSessions
+        expected = (
+            [self.today - timedelta(days=i) for i in range(0, 7)]
+            + [self.today + timedelta(days=i) for i in range(1, 6)]
+        )
+        dates = []
+        # 7 passées + 5 futures : la page 2 chevauche les deux tranches
+        for number, queries in ((1, 2), (2, 3), (3, 2)):
+            with self.assertNumQueries(queries):
+                paginator = Paginator(PastThenFutureSessions(Session.objects.all(), self.today), 5)
+                dates += [s.date for s in paginator.page(number)]
+        self.assertEqual(paginator.num_pages, 3)
+        self.assertEqual(dates, expected)
+
+
+class SessionIndexPlanTest(TestCase):
+    """Les requêtes principales de views.py / api_views.py doivent passer par un index."""
+
+    def _main_queries(self):
+        d = date(2026, 6, 1)
+        return {
+            'planning du jour (teacher_view)': Session.objects.filter(teacher_id=1, date=d, status='scheduled'),
+            'semaine formateur': Session.objects.filter(teacher_id=1, date__gte=d, date__lte=d),
+            'séances terminées formateur': Session.objects.filter(teacher_id=1, status='completed'),
+            'graphes admin': Session.objects.filter(status='completed', date__gte=d, date__lt=d),
+            'reporting': Session.objects.filter(seance_realisee=True, date__gte=d, date__lte=d),
+            'fiches à valider': Session.objects.filter(fiche_completee=True, statut_validation='en_attente'),
+            'édition de série': Session.objects.filter(series_id=1, series_index__gte=3),
+            'séances étudiant': Session.objects.filter(students=1),
+        }
+
+    def _plan(self, qs):
+        from django.db import connection
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Tables de test quasi vides : on interdit le seq scan pour vérifier
+                # qu'un index utilisable existe.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return qs.explain()
+
+    def test_main_queries_use_index(self):
+        from django.db import connection
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            self.skipTest('plans vérifiés pour PostgreSQL et SQLite uniquement')
+        for label, qs in self._main_queries().items():
+            plan = self._plan(qs)
+            with self.subTest(label, plan=plan):
+                if connection.vendor == 'postgresql':
+                    self.assertNotIn('Seq Scan on dashboard_session', plan)
+                    self.assertIn('Index', plan)
+                else:
+                    self.assertRegex(plan, r'SEARCH dashboard_session\w* USING (COVERING )?INDEX')
+
+
+class QueryBudgetMiddlewareTest(TestCase):
+    def _middleware(self, view):
+        from SchoolManagement.middleware import QueryBudgetMiddleware
+        return QueryBudgetMiddleware(view)
+
+    def _n_plus_one_view(self, request):
+        from django.http import HttpResponse
+        for pk in range(3):
+            list(Language.objects.filter(pk=pk))
+        return HttpResponse('ok')
+
+    def test_server_timing_header(self):
+        from django.test import RequestFactory, override_settings
+        with override_settings(QUERY_BUDGET_SERVER_TIMING=True):
+            response = self._middleware(self._n_plus_one_view)(RequestFactory().get('/x/'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="3 queries"$')
+
+    def test_repeated_query_shape_is_logged(self):
+        from django.test import RequestFactory, override_settings
+        with override_settings(QUERY_BUDGET_NPLUSONE_THRESHOLD=3), \
+                self.assertLogs('SchoolManagement.middleware', 'WARNING') as logs:
+            self._middleware(self._n_plus_one_view)(RequestFactory().get('/x/'))
+        self.assertIn('3× SELECT', logs.output[0])
+
+    def test_budget_exceeded_fails_in_tests(self):
+        from django.test import override_settings
+        from SchoolManagement.middleware import QueryBudgetExceeded
+        make_user('admin_qb', 'admin')
+        self.client.login(username='admin_qb', password='pass')
+        with override_settings(QUERY_BUDGETS={'admin_dashboard': 2}, QUERY_BUDGET_RAISE=True):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/administrateur/')
+
+
+class ReportingEngineTest(TestCase):
+    def setUp(self):
+        self.lang = Language.objects.create(name='Arabe', code='ar')
+        self.t1 = Teacher.objects.get(user=make_user('teacher_rp1', 'teacher'))
+        self.t2 = Teacher.objects.get(user=make_user('teacher_rp2', 'teacher'))
+        self.s1 = Student.objects.get(user=make_user('student_rp1', 'student'))
+        self.s2 = Student.objects.get(user=make_user('student_rp2', 'student'))
+        self.debut, self.fin = date(2026, 6, 1), date(2026, 6, 14)
+        cache.clear()
+
+    def _session(self, teacher, students, day=date(2026, 6, 5), score=None, **kwargs):
+        s = Session.objects.create(
+            teacher=teacher, language=self.lang, date=day,
+            start_time=time(10, 0), end_time=time(11, 0), seance_realisee=True,
+            participation=score, comprehension_score=score, engagement=score, **kwargs
+        )
+        s.students.set(students)
+        return s
+
+    def test_teachers_report(self):
+        from dashboard.reporting import teachers_report
+        # t1 : s1 en difficulté (moyenne 1.5), s2 non (4) ; séance de groupe comptée une fois
+        self._session(self.t1, [self.s1, self.s2], score=2, comp_oral=True, statut_validation='validee')
+        self._session(self.t1, [self.s1], score=1, comp_grammaire=True)
+        self._session(self.t1, [self.s2], score=4, comp_grammaire=True)
+        self._session(self.t1, [self.s2], score=4, comp_grammaire=True)
+        self._session(self.t2, [], comp_ecrit=True)
+        self._session(self.t2, [self.s1], day=date(2026, 7, 1))  # hors période
+
+        with self.assertNumQueries(3):
+            report = teachers_report(self.debut, self.fin)
+            rows = {row['teacher'].pk: row for row in report['teachers_stats']}
+            [row['teacher'].user.profile_picture_url for row in report['teachers_stats']]
+
+        self.assertEqual(rows[self.t1.pk]['nb_sessions'], 4)
+        self.assertEqual(rows[self.t1.pk]['nb_sessions_validees'], 1)
+        self.assertEqual(rows[self.t1.pk]['nb_students'], 2)
+        self.assertEqual(rows[self.t1.pk]['nb_en_difficulte'], 1)
+        self.assertEqual(rows[self.t1.pk]['top_comp_faible'], 'Grammaire')
+        self.assertEqual(rows[self.t2.pk]['nb_sessions'], 1)
+        self.assertEqual(rows[self.t2.pk]['nb_students'], 0)
+        self.assertEqual(rows[self.t2.pk]['top_comp_faible'], 'Écrit')
+        self.assertEqual(report['total_sessions_global'], 5)
+        self.assertEqual(report['total_teachers_actifs'], 2)
+        self.assertEqual(report['total_students_global'], 2)
+
+    def test_teacher_report(self):
+        from dashboard.reporting import teacher_report
+        self._session(self.t1, [self.s1, self.s2], score=2, comp_oral=True, statut_validation='validee')
+        self._session(self.t1, [self.s1], score=1, comp_oral=True)
+        self._session(self.t1, [self.s2], score=4, comp_ecrit=True)
+        self._session(self.t2, [self.s1], score=4)
+
+        with self.assertNumQueries(3):
+            report = teacher_report(self.t1, self.debut, self.fin)
+            [str(stat['student']) for stat in report['student_stats']]
+
+        self.assertEqual(report['total_sessions'], 3)
+        self.assertEqual(report['sessions_validees'], 1)
+        stats = {stat['student'].pk: stat for stat in report['student_stats']}
+        self.assertEqual(stats[self.s1.pk]['nb_sessions'], 2)
+        self.assertEqual(stats[self.s1.pk]['avg_participation'], 1.5)
+        self.assertEqual(stats[self.s2.pk]['avg_engagement'], 3.0)
+        self.assertEqual(report['students_en_difficulte'], [self.s1])
+        self.assertEqual(report['comp_faibles']['Oral'], 2)
+        self.assertEqual(report['comp_faibles']['Écrit'], 1)
+        self.assertEqual(report['comp_faibles']['Grammaire'], 0)
+        self.assertEqual(len(report['sessions_list']), 3)
+
+    def test_report_cache_invalidation(self):
+        from dashboard.reporting import teacher_report, teachers_report
+        s1 = self._session(self.t1, [self.s1], score=2)
+        self._session(self.t2, [self.s2], score=4)
+        teacher_report(self.t1, self.debut, self.fin)
+        teacher_report(self.t2, self.debut, self.fin)
+        teachers_report(self.debut, self.fin)
+
+        # Agrégats servis depuis le cache : seule la relecture des objets reste
+        with self.assertNumQueries(1):
+            teacher_report(self.t1, self.debut, self.fin)
+        with self.assertNumQueries(1):
+            teachers_report(self.debut, self.fin)
+
+        # Une modification de fiche n'invalide que le formateur et le mois touchés
+        s1.participation = 5
+        s1.save(update_fields=['participation'])
+        with self.assertNumQueries(1):
+            teacher_report(self.t2, self.debut, self.fin)
+        report = teacher_report(self.t1, self.debut, self.fin)
+        self.assertEqual(report['student_stats'][0]['avg_participation'], 5.0)
+        self.assertEqual(teachers_report(self.debut, self.fin)['teachers_stats'][0]['nb_en_difficulte'], 0)
+
+        # Un champ hors reporting ne change pas la version
+        s1.meeting_link = 'https://meet.example.com/x'
+        s1.save(update_fields=['meeting_link'])
+        with self.assertNumQueries(1):
+            teacher_report(self.t1, self.debut, self.fin)
+
+        # Ajout d'un étudiant à la séance
+        s1.students.add(self.s2)
+        self.assertEqual(len(teacher_report(self.t1, self.debut, self.fin)['student_stats']), 2)
+
+    def test_series_teacher_change_invalidates_both_teachers(self):
+        from dashboard.reporting import teacher_report
+        series = SessionSeries.objects.create(
+            teacher=self.t1, language=self.lang, day_of_week=0,
+            start_time=time(10, 0), end_time=time(11, 0),
+            recurrence_start=self.debut, recurrence_end=self.fin,
+        )
+        sessions = generate_series_occurrences(series)
+        Session.objects.filter(series=series).update(seance_realisee=True)
+        cache.clear()
+        self.assertEqual(teacher_report(self.t1, self.debut, self.fin)['total_sessions'], 2)
+        self.assertEqual(teacher_report(self.t2, self.debut, self.fin)['total_sessions'], 0)
+
+        apply_series_edit(sessions[0], 'all', {'teacher': self.t2})
+        self.assertEqual(teacher_report(self.t1, self.debut, self.fin)['total_sessions'], 0)
+        self.assertEqual(teacher_report(self.t2, self.debut, self.fin)['total_sessions'], 2)
+
+    def test_series_delete_bumps_once(self):
+        from unittest import mock
+        from dashboard import reporting
+        from dashboard.reporting import teacher_report
+        from dashboard.services import apply_series_delete
+        series = SessionSeries.objects.create(
+            teacher=self.t1, language=self.lang, day_of_week=0,
+            start_time=time(10, 0), end_time=time(11, 0),
+            recurrence_start=self.debut, recurrence_end=self.fin,
+        )
+        sessions = generate_series_occurrences(series)
+        Session.objects.filter(series=series).update(seance_realisee=True)
+        cache.clear()
+        self.assertEqual(teacher_report(self.t1, self.debut, self.fin)['total_sessions'], 2)
+
+        with mock.patch.object(reporting.cache, 'set_many', wraps=reporting.cache.set_many) as set_many:
+            apply_series_delete(sessions[0], 'all')
+        self.assertEqual(set_many.call_count, 1)
+        self.assertEqual(teacher_report(self.t1, self.debut, self.fin)['total_sessions'], 0)
+
+
+class SessionsFeedTest(TestCase):
+    def setUp(self):
+        self.lang = Language.objects.create(name='Anglais', code='en')
+        self.teacher = Teacher.objects.get(user=make_user('teacher_feed', 'teacher', 'Ana', 'Prof'))
+        self.students = [
+            Student.objects.get(user=make_user(f'student_feed{i}', 'student', 'Eleve', str(i)))
+            for i in range(3)
+        ]
+        make_user('admin_feed', 'admin')
+        self.client.login(username='admin_feed', password='pass')
+
+    def _sessions(self, count, day):
+        for i in range(count):
+            s = Session.objects.create(
+                teacher=self.teacher, language=self.lang, date=day + timedelta(days=i % 7),
+                start_time=time(9, 0), end_time=time(10, 0),
+            )
+            s.students.set(self.students[:1 + i % 3])
+
+    def _feed(self, start, end):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/sessions/', {'start': start, 'end': end})
+            events = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(response.status_code, 200)
+        return events, len(ctx)
+
+    def test_feed_query_count_is_constant(self):
+        self._sessions(2, date(2026, 3, 2))
+        self._sessions(20, date(2026, 4, 6))
+        small, small_queries = self._feed('2026-03-01', '2026-03-31')
+        large, large_queries = self._feed('2026-04-01', '2026-04-30')
+        self.assertEqual(len(small), 2)
+        self.assertEqual(len(large), 20)
+        self.assertEqual(small_queries, large_queries)
+
+    def test_budget_counts_streamed_queries(self):
+        from django.test import override_settings
+        from SchoolManagement.middleware import QueryBudgetExceeded
+        self._sessions(2, date(2026, 3, 2))
+        params = {'start': '2026-03-01', 'end': '2026-03-31'}
+        _, queries = self._feed(**params)
+        # Budget atteint par les requêtes du flux, après le retour de la vue
+        with override_settings(QUERY_BUDGETS={'api_sessions_feed': queries - 1}, QUERY_BUDGET_RAISE=True):
+            response = self.client.get('/api/sessions/', params)
+            with self.assertRaises(QueryBudgetExceeded):
+                b''.join(response.streaming_content)
+
+    def test_event_payload(self):
+        self._sessions(3, date(2026, 3, 2))
+        events, _ = self._feed('2026-03-01', '2026-03-31')
+        event = events[2]
+        self.assertEqual(sorted(event['extendedProps']['students']), ['Eleve 0', 'Eleve 1', 'Eleve 2'])
+        self.assertTrue(event['title'].startswith('Anglais · Ana Prof · Eleve'))
+        self.assertEqual(event['extendedProps']['status_display'], 'Prévue')
+        self.assertEqual(event['start'], '2026-03-04T09:00:00')
+
+        # Même rendu que la sérialisation d'une séance chargée (création / mise à jour)
+        from dashboard.api_views import _session_to_event
+        session = Session.objects.prefetch_related('students__user').get(pk=event['id'])
+        expected = _session_to_event(session)
+        self.assertEqual(
+            {**event, 'title': None, 'extendedProps': {**event['extendedProps'], 'students': None}},
+            {**expected, 'title': None, 'extendedProps': {**expected['extendedProps'], 'students': None}},
+        )
+
+    def test_feed_projection_skips_text_fields(self):
+        self._sessions(1, date(2026, 3, 2))
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            self._feed('2026-03-01', '2026-03-31')
+        feed_sql = [q['sql'] for q in ctx.captured_queries if '"dashboard_session" ' in q['sql']]
+        self.assertEqual(len(feed_sql), 2)  # empreinte ETag + projection
+        for sql in feed_sql:
+            self.assertNotIn('observations_formateur', sql)
+
+    def test_conditional_get(self):
+        self._sessions(2, date(2026, 3, 2))
+        params = {'start': '2026-03-01', 'end': '2026-03-31'}
+        response = self.client.get('/api/sessions/', params)
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(4):  # session, utilisateur, empreinte séances + séries
+            response = self.client.get('/api/sessions/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Une autre fenêtre n'a pas la même empreinte
+        other = self.client.get('/api/sessions/', {**params, 'end': '2026-03-03'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other.status_code, 200)
+
+        session = Session.objects.filter(date__month=3).first()
+        session.students.add(self.students[2])
+        response = self.client.get('/api/sessions/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        from django.utils import timezone
+        from django.utils.http import http_date
+        since = http_date(timezone.now().timestamp())
+        session.delete()
+        response = self.client.get('/api/sessions/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        # Une suppression ne change pas MAX(updated_at) : If-Modified-Since ne doit pas donner 304
+        response = self.client.get('/api/sessions/', params, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+
+
+class BulkSeriesGenerationTest(TestCase):
+    def setUp(self):
+        self.lang = Language.objects.create(name='Espagnol', code='es')
+        self.teacher = Teacher.objects.get(user=make_user('teacher_bulk', 'teacher'))
+        self.students = [
+            Student.objects.get(user=make_user(f'student_bulk{i}', 'student')) for i in range(2)
+        ]
+
+    def test_yearly_series_in_constant_queries(self):
+        from dashboard.models import SessionSeries, MonthlyRollup
+        from dashboard.services import get_monthly_rollups
+        series = SessionSeries.objects.create(
+            teacher=self.teacher, language=self.lang, day_of_week=0,
+            start_time=time(10, 0), end_time=time(11, 0),
+            recurrence_start=date(2026, 1, 5), recurrence_end=date(2027, 1, 4),
+        )
+        series.students.set(self.students)
+        get_monthly_rollups(date(2026, 1, 1), 3)  # mois déjà matérialisés
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            sessions = generate_series_occurrences(series)
+        # Indépendant du nombre d'occurrences (les INSERT peuvent être découpés par lots)
+        self.assertLessEqual(len(ctx), 10)
+
+        self.assertEqual(len(sessions), 53)
+        self.assertEqual(sessions[-1].series_index, 52)
+        self.assertTrue(all(s.pk for s in sessions))
+        self.assertEqual(Session.students.through.objects.filter(session__series=series).count(), 106)
+        self.assertEqual(set(sessions[10].students.all()), set(self.students))
+        self.assertEqual(MonthlyRollup.objects.get(month=date(2026, 1, 1)).sessions_scheduled, 4)
+
+    def test_series_delete_refreshes_each_month_once(self):
+        from dashboard.models import SessionSeries, MonthlyRollup
+        from dashboard.services import apply_series_delete, get_monthly_rollups
+        series = SessionSeries.objects.create(
+            teacher=self.teacher, language=self.lang, day_of_week=0,
+            start_time=time(10, 0), end_time=time(11, 0),
+            recurrence_start=date(2026, 1, 5), recurrence_end=date(2026, 12, 28),
+        )
+        series.students.set(self.students)
+        sessions = generate_series_occurrences(series)
+        get_monthly_rollups(date(2026, 1, 1), 12)
+        self.assertEqual(MonthlyRollup.objects.get(month=date(2026, 3, 1)).sessions_scheduled, 5)
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            apply_series_delete(sessions[0], 'all')
+        rollup_queries = [q for q in ctx.captured_queries if 'dashboard_monthlyrollup' in q['sql']]
+        self.assertLessEqual(len(rollup_queries), 2)  # une lecture, un bulk_update
+        self.assertLessEqual(len(ctx), 20)  # indépendant du nombre d'occurrences
+        self.assertEqual(MonthlyRollup.objects.get(month=date(2026, 3, 1)).sessions_scheduled, 0)
+        self.assertFalse(Session.objects.filter(series_id=series.pk).exists())
+
+    def test_series_student_edit_is_set_based(self):
+        from dashboard.models import SessionSeries
+        from dashboard.services import apply_series_edit
+        series = SessionSeries.objects.create(
+            teacher=self.teacher, language=self.lang, day_of_week=0,
+            start_time=time(10, 0), end_time=time(11, 0),
+            recurrence_start=date(2026, 1, 5), recurrence_end=date(2026, 6, 29),
+        )
+        series.students.set(self.students[:1])
+        sessions = generate_series_occurrences(series)
+        newcomer = Student.objects.get(user=make_user('student_bulk_new', 'student'))
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            apply_series_edit(sessions[10], 'this_and_future', {
+                'students': [self.students[1], newcomer],
+            })
+        self.assertLessEqual(len(ctx), 12)  # constant, quel que soit le nombre de séances
+
+        self.assertEqual(list(sessions[9].students.all()), [self.students[0]])
+        for session in sessions[10:]:
+            self.assertEqual(set(session.students.all()), {self.students[1], newcomer})
+
+
+class SeriesHorizonTest(TestCase):
+    def setUp(self):
+        from dashboard.models import SessionSeries
+        self.lang = Language.objects.create(name='Italien', code='it')
+        self.teacher = Teacher.objects.get(user=make_user('teacher_hz', 'teacher', 'Ivo', 'Prof'))
+        self.student = Student.objects.get(user=make_user('student_hz', 'student', 'Lia', 'Eleve'))
+        # Série sans fin, le lundi à partir du 5 janvier 2026
+        self.series = SessionSeries.objects.create(
+            teacher=self.teacher, language=self.lang, day_of_week=0,
+            start_time=time(10, 0), end_time=time(11, 0), recurrence_start=date(2026, 1, 5),
+        )
+        self.series.students.add(self.student)
+
+    def _indexes(self):
+        return list(
+            Session.objects.filter(series=self.series).order_by('date').values_list('series_index', flat=True)
+        )
+
+    def test_rolling_generation_and_extension(self):
+        from dashboard.services import extend_series_horizons
+        sessions = generate_series_occurrences(self.series, today=date(2026, 1, 5))
+        self.assertEqual(len(sessions), 9)  # 5 janvier → 2 mars (8 semaines)
+        self.series.refresh_from_db()
+        self.assertEqual(self.series.materialized_until, date(2026, 3, 2))
+        self.assertEqual(generate_series_occurrences(self.series, today=date(2026, 1, 5)), [])
+
+        self.assertEqual(extend_series_horizons(today=date(2026, 2, 2)), 4)
+        self.assertEqual(self._indexes(), list(range(13)))
+        self.assertEqual(Session.objects.filter(series=self.series, students=self.student).count(), 13)
+
+        # Sans date de fin, l'horizon continue de glisser au-delà d'un an
+        extend_series_horizons(today=date(2027, 6, 1))
+        self.assertEqual(Session.objects.filter(series=self.series).latest("date").date, date(2027, 7, 26))
+
+    def test_horizon_extended_on_first_request_of_the_day(self):
+        from django.test import override_settings
+        from django.utils import timezone
+        from dashboard import services
+        generate_series_occurrences(self.series, today=date(2026, 1, 5))
+        cache.clear()
+        services._horizons_checked['day'] = None
+        self.addCleanup(services._horizons_checked.update, day=None)
+        today = timezone.localdate()
+
+        with override_settings(SERIES_HORIZON_ON_REQUEST=True):
+            self.client.get('/accounts/login/')
+            self.series.refresh_from_db()
+            self.assertEqual(self.series.materialized_until, services.series_horizon(self.series, today))
+
+            # Déjà fait aujourd'hui : plus aucune requête sur les séries
+            from django.db import connection
+            from django.test.utils import CaptureQueriesContext
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get('/accounts/login/')
+            self.assertFalse([q for q in ctx.captured_queries if 'dashboard_sessionseries' in q['sql']])
+
+    def test_delete_this_and_future_stops_the_series(self):
+        from dashboard.services import extend_series_horizons
+        sessions = generate_series_occurrences(self.series, today=date(2026, 1, 5))
+        apply_series_delete(sessions[5], 'this_and_future')
+        self.series.refresh_from_db()
+        self.assertEqual(self.series.recurrence_end, date(2026, 2, 8))
+        self.assertEqual(extend_series_horizons(today=date(2026, 3, 2)), 0)
+        self.assertEqual(self._indexes(), list(range(5)))
+
+    def test_edit_all_updates_future_generation(self):
+        sessions = generate_series_occurrences(self.series, today=date(2026, 1, 5))
+        apply_series_edit(sessions[0], 'all', {'start_time': time(14, 0), 'end_time': time(15, 0)})
+        new = generate_series_occurrences(self.series, today=date(2026, 2, 2))
+        self.assertEqual({s.start_time for s in new}, {time(14, 0)})
+
+    def test_feed_expands_virtual_occurrences(self):
+        generate_series_occurrences(self.series, today=date(2026, 1, 5))
+        make_user('admin_hz', 'admin')
+        self.client.login(username='admin_hz', password='pass')
+
+        response = self.client.get('/api/sessions/', {'start': '2026-02-01', 'end': '2026-03-31'})
+        events = json.loads(b''.join(response.streaming_content))
+        real = [e for e in events if not e['extendedProps'].get('virtual')]
+        virtual = [e for e in events if e['extendedProps'].get('virtual')]
+        self.assertEqual(len(real), 5)     # 2 février → 2 mars
+        self.assertEqual([e['start'][:10] for e in virtual], ['2026-03-09', '2026-03-16', '2026-03-23', '2026-03-30'])
+        self.assertEqual(virtual[0]['id'], f'series-{self.series.pk}-9')
+        self.assertFalse(virtual[0]['editable'])
+        self.assertEqual(virtual[0]['title'], 'Italien · Ivo Prof · Lia Eleve')
+
+        # La fenêtre de l'étudiant voit aussi les occurrences virtuelles de ses séries
+        self.client.login(username='student_hz', password='pass')
+        response = self.client.get('/api/sessions/', {'start': '2026-06-01', 'end': '2026-06-30'})
+        events = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(events), 5)
+
+        # Plus de 12 mois après le début de la série
+        response = self.client.get('/api/sessions/', {'start': '2028-03-01', 'end': '2028-03-31'})
+        events = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([e['start'][:10] for e in events], ['2028-03-06', '2028-03-13', '2028-03-20', '2028-03-27'])
+
+
+class SessionCompletionBatchTest(TestCase):
+    def setUp(self):
+        lang = Language.objects.create(name='Portugais', code='pt')
+        self.teacher = Teacher.objects.get(user=make_user('teacher_cb', 'teacher'))
+        self.students = [
+            Student.objects.get(user=make_user(f'student_cb{i}', 'student')) for i in range(5)
+        ]
+        self.session = Session.objects.create(
+            teacher=self.teacher, language=lang, date=date(2026, 5, 4),
+            start_time=time(10, 0), end_time=time(11, 30),
+        )
+        self.session.students.set(self.students)
+
+    def test_completion_is_batched(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.session.status = 'completed'
+        with CaptureQueriesContext(connection) as ctx:
+            self.session.save()
+        student_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "dashboard_student"')]
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT') and 'dashboard_notification' in q['sql']]
+        self.assertEqual(len(student_updates), 1)
+        self.assertEqual(len(inserts), 1)
+
+        for student in Student.objects.filter(pk__in=[s.pk for s in self.students]):
+            self.assertEqual(student.total_hours_used, 2)  # 1.5 h arrondie à l'heure (IntegerField)
+        self.assertEqual(self.session.notifications.count(), 5)
+
+    def test_dedup_uses_session_key(self):
+        Notification.objects.create(
+            user=self.students[0].user, session=self.session,
+            notification_type='evaluation_request', title='déjà envoyée', message='—',
+        )
+        self.session.status = 'completed'
+        self.session.save()
+        self.assertEqual(self.session.notifications.filter(user=self.students[0].user).count(), 1)
+        self.assertEqual(self.session.notifications.count(), 5)
+
+
+class SessionStateTrackingTest(TestCase):
+    def setUp(self):
+        lang = Language.objects.create(name='Allemand', code='de')
+        self.teacher = Teacher.objects.get(user=make_user('teacher_st', 'teacher'))
+        self.student = Student.objects.get(user=make_user('student_st', 'student'))
+        session = Session.objects.create(
+            teacher=self.teacher, language=lang, date=date(2026, 5, 4),
+            start_time=time(10, 0), end_time=time(11, 0),
+        )
+        session.students.add(self.student)
+        self.pk = session.pk
+
+    def test_loaded_state(self):
+        session = Session.objects.get(pk=self.pk)
+        self.assertEqual(session.loaded_value('status'), 'scheduled')
+        self.assertEqual(session.changed_fields(), set())
+        session.status = 'cancelled'
+        self.assertEqual(session.changed_fields(), {'status'})
+        session.save()
+        self.assertEqual(session.changed_fields(), set())
+        self.assertEqual(session.loaded_value('status'), 'cancelled')
+
+    def test_no_select_before_save(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        session = Session.objects.get(pk=self.pk)
+        session.start_time = time(9, 0)
+        with CaptureQueriesContext(connection) as ctx:
+            session.save(update_fields=['start_time'])
+        self.assertEqual([q['sql'].split()[0] for q in ctx.captured_queries], ['UPDATE'])
+
+    def test_status_transition_detected_without_select(self):
+        session = Session.objects.get(pk=self.pk)
+        session.status = 'completed'
+        session.save(update_fields=['status'])
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.total_hours_used, 1)
+        # Deuxième sauvegarde : l'état chargé est déjà "completed", pas de double décompte
+        session.save(update_fields=['status'])
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.total_hours_used, 1)
+
+    def test_deferred_status_falls_back_to_query(self):
+        session = Session.objects.only('id', 'teacher_id').get(pk=self.pk)
+        session.status = 'completed'
+        session.save()
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.total_hours_used, 1)
+
+
+class StudentHourLedgerTest(TestCase):
+    def setUp(self):
+        from dashboard.models import Payment
+        self.lang = Language.objects.create(name='Russe', code='ru')
+        self.student = Student.objects.get(user=make_user('student_hl', 'student'))
+        self.other = Student.objects.get(user=make_user('student_hl2', 'student'))
+        self.Payment = Payment
+
+    def _payment(self, hours, status='paid', invoice='INV-1', student=None):
+        return self.Payment.objects.create(
+            student=student or self.student, amount=100, hours_purchased=hours, hours_remaining=hours,
+            payment_type='package', languages=self.lang, status=status, invoice_number=invoice,
+        )
+
+    def _purchased(self, student=None):
+        return Student.objects.get(pk=(student or self.student).pk).total_hours_purchased
+
+    def test_incremental_updates(self):
+        payment = self._payment(10)
+        self._payment(5, invoice='INV-2')
+        self.assertEqual(self._purchased(), 15)
+
+        payment = self.Payment.objects.get(pk=payment.pk)
+        payment.hours_purchased = 12
+        payment.save()
+        self.assertEqual(self._purchased(), 17)
+
+        payment.status = 'refunded'
+        payment.save()
+        self.assertEqual(self._purchased(), 5)
+
+        payment.status = 'paid'
+        payment.student = self.other
+        payment.save()
+        self.assertEqual(self._purchased(), 5)
+        self.assertEqual(self._purchased(self.other), 12)
+
+        payment.delete()
+        self.assertEqual(self._purchased(self.other), 0)
+
+    def test_unchanged_payment_save_costs_no_student_query(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        payment = self.Payment.objects.get(pk=self._payment(10).pk)
+        payment.expiry_date = date(2027, 1, 1)
+        with CaptureQueriesContext(connection) as ctx:
+            payment.save()
+        self.assertFalse([q for q in ctx.captured_queries if 'dashboard_student' in q['sql'] and 'UPDATE' in q['sql']])
+
+    def test_reconcile(self):
+        from dashboard.services import reconcile_student_hours
+        self._payment(10)
+        self.assertEqual(reconcile_student_hours(), [])
+
+        Student.objects.filter(pk=self.student.pk).update(total_hours_purchased=3, total_hours_used=7)
+        mismatches = reconcile_student_hours(fix=True)
+        self.assertEqual(
+            sorted((m[1], m[2], m[3]) for m in mismatches),
+            [('total_hours_purchased', 3, 10), ('total_hours_used', 7, 0)],
+        )
+        self.assertEqual(self._purchased(), 10)
+        self.assertEqual(reconcile_student_hours(), [])
+
+    def test_reconcile_fix_converges_on_fractional_hours(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from dashboard.services import reconcile_student_hours
+        session = Session.objects.create(
+            teacher=Teacher.objects.get(user=make_user('teacher_hl', 'teacher')), language=self.lang,
+            date=date(2026, 5, 4), start_time=time(10, 0), end_time=time(11, 30), status='completed',
+        )
+        session.students.set([self.student])
+        Student.objects.filter(pk=self.student.pk).update(total_hours_used=0)
+
+        call_command('reconcile_student_hours', '--fix', stdout=StringIO())
+        self.assertEqual(Student.objects.get(pk=self.student.pk).total_hours_used, 2)
+        out = StringIO()
+        call_command('reconcile_student_hours', '--fix', stdout=out)
+        self.assertIn("Aucun écart", out.getvalue())
+        self.assertEqual(reconcile_student_hours(), [])
+
+    def test_signal_and_reconcile_round_each_session_alike(self):
+        from dashboard.services import reconcile_student_hours
+        teacher = Teacher.objects.get(user=make_user('teacher_hl', 'teacher'))
+        for day, end in ((4, time(11, 30)), (11, time(11, 30)), (18, time(12, 30))):
+            session = Session.objects.create(
+                teacher=teacher, language=self.lang, date=date(2026, 5, day),
+                start_time=time(10, 0), end_time=end,
+            )
+            session.students.set([self.student])
+            session.status = 'completed'
+            session.save()
+        # 1.5 h -> 2, 1.5 h -> 2, 2.5 h -> 3 (arrondi bancaire : 2)
+        self.assertEqual(Student.objects.get(pk=self.student.pk).total_hours_used, 7)
+        self.assertEqual(reconcile_student_hours(), [])
+
+
+class NotificationFanOutTest(TestCase):
+    def setUp(self):
+        lang = Language.objects.create(name='Chinois', code='zh')
+        self.teacher_user = make_user('teacher_fo', 'teacher')
+        self.teacher = Teacher.objects.get(user=self.teacher_user)
+        self.admins = [make_user(f'admin_fo{i}', 'admin') for i in range(2)]
+        self.students = [Student.objects.get(user=make_user(f'student_fo{i}', 'student')) for i in range(3)]
+        self.session = Session.objects.create(
+            teacher=self.teacher, language=lang, date=date(2026, 5, 4),
+            start_time=time(10, 0), end_time=time(11, 0),
+        )
+        self.session.students.set(self.students[:2])
+
+    def _inserts(self, ctx):
+        return [q for q in ctx.captured_queries
+                if q['sql'].startswith('INSERT INTO "dashboard_notification"')]
+
+    def test_notify_single_insert(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from dashboard.notifications import notify
+        with CaptureQueriesContext(connection) as ctx:
+            created = notify(User.objects.filter(role='student'), 'system', 'Titre', 'Message')
+        self.assertEqual(len(created), 3)
+        self.assertEqual(len(ctx), 2)  # lecture des ids + INSERT
+        self.assertEqual(notify([], 'system', 'Titre', 'Message'), [])
+
+    def test_status_update_fans_out_in_one_insert(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.client.login(username='teacher_fo', password='pass')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(f'/teacher/sessions/{self.session.pk}/statut/', {'status': 'cancelled'})
+        self.assertEqual(len(self._inserts(ctx)), 1)
+        # Jointure étudiants/séances : doublons écartés en SQL
+        self.assertTrue([q for q in ctx.captured_queries if q['sql'].startswith('SELECT DISTINCT "dashboard_customuser"."id"')])
+        recipients = set(Notification.objects.filter(notification_type='system').values_list('user__username', flat=True))
+        self.assertEqual(recipients, {'admin_fo0', 'admin_fo1', 'student_fo0', 'student_fo1'})
+
+    def test_session_delete_keeps_notifications(self):
+        from dashboard.notifications import notify
+        notify([self.students[0].user_id], 'evaluation_request', 'Évaluation', '—', session=self.session)
+        self.session.delete()
+        notification = Notification.objects.get(title='Évaluation')
+        self.assertIsNone(notification.session_id)
+
+
+class UnreadCounterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('student_uc', 'student')
+        self.client.login(username='student_uc', password='pass')
+
+    def _unread(self):
+        return self.client.get('/api/notifications/unread/').json()['count']
+
+    def test_count_cached_and_invalidated(self):
+        from dashboard.notifications import notify
+        self.assertEqual(self._unread(), 0)
+        with self.assertNumQueries(2):  # session + utilisateur, pas de COUNT
+            self.assertEqual(self._unread(), 0)
+
+        notify([self.user.pk], 'system', 'A', '—')
+        Notification.objects.create(user=self.user, notification_type='system', title='B', message='—')
+        self.assertEqual(self._unread(), 2)
+
+        notification = Notification.objects.get(title='B')
+        notification.is_read = True
+        notification.save()
+        self.assertEqual(self._unread(), 1)
+
+        self.client.post('/notifications/mark-read/')
+        self.assertEqual(self._unread(), 0)
+
+        Notification.objects.create(user=self.user, notification_type='system', title='C', message='—')
+        self.assertEqual(self._unread(), 1)
+        Notification.objects.get(title='C').delete()
+        self.assertEqual(self._unread(), 0)
+
+    def test_user_delete_invalidates_count(self):
+        from dashboard.notifications import notify, unread_count
+        notify([self.user.pk], 'system', 'A', '—')
+        self.assertEqual(unread_count(self.user.pk), 1)
+        user_id = self.user.pk
+        self.user.delete()
+        self.assertEqual(unread_count(user_id), 0)
+
+
+class NotificationPaginationArchiveTest(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        self.user = make_user('student_np', 'student')
+        self.now = timezone.now()
+        for i in range(7):
+            Notification.objects.create(user=self.user, notification_type='system', title=f'N{i}', message='—')
+        # Trois notifications à la même date : le départage se fait sur l'id
+        Notification.objects.filter(title__in=['N2', 'N3', 'N4']).update(created_at=self.now - timedelta(hours=1))
+        for i in (0, 1):
+            Notification.objects.filter(title=f'N{i}').update(created_at=self.now - timedelta(days=200 - i))
+
+    def test_cursor_walk(self):
+        from dashboard.pagination import cursor_paginate
+        qs = Notification.objects.filter(user=self.user)
+        expected = list(qs.order_by('-created_at', '-pk').values_list('title', flat=True))
+
+        seen, pages, page = [], [], cursor_paginate(qs, per_page=3)
+        self.assertFalse(page.has_previous)
+        while True:
+            pages.append(page)
+            seen += [n.title for n in page]
+            if not page.has_next:
+                break
+            with self.assertNumQueries(1):
+                page = cursor_paginate(qs, after=page.next_cursor, per_page=3)
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+
+        back = cursor_paginate(qs, before=pages[2].previous_cursor, per_page=3)
+        self.assertEqual([n.title for n in back], [n.title for n in pages[1]])
+        self.assertTrue(back.has_previous and back.has_next)
+        # Curseur illisible : première page
+        self.assertEqual(len(cursor_paginate(qs, after='???', per_page=3)), 3)
+
+    def test_inbox_pages(self):
+        self.client.login(username='student_np', password='pass')
+        response = self.client.get('/notifications/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['notifications']), 7)
+
+    def test_archive_read_notifications(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from dashboard.models import ArchivedNotification
+        Notification.objects.filter(title__in=['N0', 'N1', 'N5']).update(is_read=True)
+        call_command('archive_notifications', '--batch-size', '1', stdout=StringIO())
+        # N5 est lue mais récente : conservée
+        self.assertEqual(
+            set(ArchivedNotification.objects.values_list('title', flat=True)), {'N0', 'N1'}
+        )
+        self.assertFalse(Notification.objects.filter(title__in=['N0', 'N1']).exists())
+        archived = ArchivedNotification.objects.get(title='N0')
+        self.assertEqual(archived.created_at, self.now - timedelta(days=200))
+
+
+class NotificationBulkActionTest(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        cache.clear()
+        self.user = make_user('student_nb', 'student')
+        other = make_user('student_nb2', 'student')
+        now = timezone.now()
+        self.notifications = []
+        for i in range(5):
+            n = Notification.objects.create(user=self.user, notification_type='system', title=f'N{i}', message='—')
+            Notification.objects.filter(pk=n.pk).update(created_at=now - timedelta(minutes=10 - i))
+            self.notifications.append(Notification.objects.get(pk=n.pk))
+        self.foreign = Notification.objects.create(user=other, notification_type='system', title='X', message='—')
+        self.client.login(username='student_nb', password='pass')
+
+    def _bulk(self, **payload):
+        return self.client.post('/api/notifications/bulk/', json.dumps(payload), content_type='application/json')
+
+    def test_mark_read_by_ids(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        ids = [self.notifications[0].pk, self.notifications[1].pk, self.foreign.pk]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._bulk(action='read', ids=ids)
+        self.assertEqual(response.json(), {'success': True, 'count': 3})
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "dashboard_notification"')]), 1)
+        self.assertFalse(Notification.objects.get(pk=self.foreign.pk).is_read)
+
+    def test_delete_up_to_cursor(self):
+        from dashboard.pagination import encode_cursor
+        response = self._bulk(action='delete', cursor=encode_cursor(self.notifications[2]))
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(
+            set(Notification.objects.filter(user=self.user).values_list('title', flat=True)), {'N3', 'N4'}
+        )
+        self.assertTrue(Notification.objects.filter(pk=self.foreign.pk).exists())
+
+    def test_delete_all_is_a_single_delete(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._bulk(action='delete')
+        self.assertEqual(response.json()['count'], 0)
+        notification_queries = [q['sql'] for q in ctx.captured_queries if '"dashboard_notification"' in q['sql']]
+        # Le DELETE, puis le recomptage des non-lues ; aucune lecture des lignes supprimées
+        self.assertEqual(len([sql for sql in notification_queries if sql.startswith('DELETE')]), 1)
+        self.assertEqual(len(notification_queries), 2)
+        self.assertTrue(Notification.objects.filter(pk=self.foreign.pk).exists())
+
+    def test_invalid_payloads(self):
+        self.assertEqual(self._bulk(action='archive').status_code, 400)
+        self.assertEqual(self._bulk(action='read', ids='1,2').status_code, 400)
+        self.assertEqual(self._bulk(action='read', cursor='???').status_code, 400)
+        self.assertEqual(Notification.objects.filter(is_read=True).count(), 0)
+
+    def test_single_endpoints_return_count(self):
+        response = self.client.post('/notifications/', {'notification_id': self.notifications[0].pk})
+        self.assertEqual(response.json(), {'success': True, 'count': 4})
+        response = self.client.post('/notifications/delete/', {'notification_id': self.foreign.pk})
+        self.assertEqual(response.json()['count'], 4)
+        self.assertTrue(Notification.objects.filter(pk=self.foreign.pk).exists())
+
+
+class RequestStatsTest(TestCase):
+    def setUp(self):
+        from dashboard.models import Request
+        self.teacher = Teacher.objects.get(user=make_user('teacher_rs', 'teacher'))
+        other_teacher = Teacher.objects.get(user=make_user('teacher_rs2', 'teacher'))
+        self.student = Student.objects.get(user=make_user('student_rs', 'student'))
+        former = Student.objects.get(user=make_user('student_rs2', 'student'))
+        self.student.current_teachers.set([self.teacher, other_teacher])
+        make = lambda student, teacher, status: Request.objects.create(
+            student=student, teacher=teacher, request_type='other',
+            subject='Sujet', description='—', status=status,
+        )
+        # Étudiant actuel : demandes au formateur et à un autre formateur
+        self.req = make(self.student, self.teacher, 'pending')
+        make(self.student, other_teacher, 'approved')
+        # Ancien étudiant : demande adressée au formateur
+        make(former, self.teacher, 'rejected')
+        # Hors périmètre
+        make(former, other_teacher, 'pending')
+
+    def test_teacher_list_and_status_update_agree(self):
+        self.client.login(username='teacher_rs', password='pass')
+        response = self.client.get('/requests/')
+        listed = {
+            key: response.context[f'{key}_requests']
+            for key in ('total', 'pending', 'processing', 'approved', 'rejected')
+        }
+        self.assertEqual(listed, {'total': 3, 'pending': 1, 'processing': 0, 'approved': 1, 'rejected': 1})
+        self.assertEqual(len(response.context['requests']), 3)
+
+        response = self.client.post('/requests/update-status/', {'request_id': self.req.pk, 'action': 'process'})
+        stats = response.json()['stats']
+        self.assertEqual(stats, {**listed, 'pending': 0, 'processing': 1})
+
+    def test_stats_single_query(self):
+        from dashboard.models import Request
+        with self.assertNumQueries(1):
+            stats = Request.objects.for_teacher(self.teacher).stats()
+        self.assertEqual(stats['total'], 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(Request.objects.filter(student=self.student).stats()['total'], 2)
+
+
+class TeacherRequestInboxTest(TestCase):
+    def setUp(self):
+        from dashboard.models import Request
+        self.teacher = Teacher.objects.get(user=make_user('teacher_ri', 'teacher'))
+        types = ['absence', 'document', 'meeting']
+        for i in range(25):
+            student = Student.objects.get(user=make_user(f'student_ri{i}', 'student'))
+            student.current_teachers.add(self.teacher)
+            Request.objects.create(
+                student=student, teacher=self.teacher, request_type=types[i % 3],
+                subject=f'Sujet {i}', description='—', status='pending' if i % 2 else 'approved',
+            )
+        self.client.login(username='teacher_ri', password='pass')
+
+    def test_paginated_constant_queries(self):
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get('/requests/')
+        page = response.context['requests']
+        self.assertEqual(len(page), 20)
+        self.assertEqual(response.context['total_requests'], 25)
+
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(f'/requests/?after={page.next_cursor}')
+        self.assertEqual(len(response.context['requests']), 5)
+        self.assertFalse(response.context['requests'].has_next)
+        self.assertEqual(len(first), len(second))
+
+    def test_filters_in_sql(self):
+        response = self.client.get('/requests/?status=pending&type=absence')
+        rows = list(response.context['requests'])
+        self.assertTrue(rows)
+        self.assertTrue(all(r.status == 'pending' and r.request_type == 'absence' for r in rows))
+        self.assertEqual(len(rows), 4)  # i impair et multiple de 3 : 3, 9, 15, 21
+        # Statistiques : toute la boîte de réception, quels que soient les filtres
+        self.assertEqual(response.context['total_requests'], 25)
+        # Filtre inconnu ignoré
+        self.assertEqual(len(self.client.get('/requests/?status=archived').context['requests']), 20)
@@ -51,6 +51,7 @@ urlpatterns = [
     path('api/sessions/<int:session_id>/delete/', api_views.api_session_delete, name='api_session_delete'),
     path('api/sessions/<int:session_id>/status/', api_views.api_session_status, name='api_session_status'),
     path('api/notifications/unread/', api_views.api_notifications_unread, name='api_notifications_unread'),
+    path('api/notifications/bulk/', api_views.api_notifications_bulk, name='api_notifications_bulk'),
 
     # ── Teacher ───────────────────────────────────────────────────
     path('teacher/courses/', teacher_courses, name='teacher_courses'),
@@ -10,6 +10,7 @@ from django.http import Http404, JsonResponse
 from datetime import date, datetime, timedelta
 from django.db.models import Count, Avg, Q
 from django.utils import timezone
+from django.utils.http import urlencode
 from django.contrib import messages
 from django.db.models import Sum
 from django.http import HttpResponse
@@ -40,6 +41,11 @@ from dashboard.models import (
 )
 from .forms import ProfileUpdateForm, SessionForm, SessionSeriesTeacherForm, ResourceForm, FichePedagogiqueForm, CertificateForm, PaiementFormateurForm, AssignmentAdminForm
 from dashboard.services import generate_series_occurrences as _teacher_generate_series
+from dashboard.services import get_student_dashboard_data, get_teacher_dashboard_stats
+from dashboard.services import add_months, get_monthly_rollups
+from dashboard.pagination import PastThenFutureSessions, cursor_paginate
+from dashboard import reporting
+from dashboard.notifications import apply_bulk_action, notify
 import json
 
 
@@ -81,61 +87,26 @@ def dashboard_view(request, username=None):
             raise Http404("Cette page est réservée aux étudiants.")
 
         student = Student.objects.filter(user=requested_user).first()
-        total_sessions = Session.objects.filter(students=student).count()
+        today = timezone.now().date()
         context = {
-            "total_sessions": total_sessions,
             "profile": profile,
             "user": request.user,
             "username": username,
+            "student": student,
+            "total_hours_purchased": student.total_hours_purchased,
+            "languages": student.languages.all(),
+            "current_teachers": student.current_teachers.all(),
         }
 
-        student = Student.objects.filter(user=requested_user).first()
-        today = timezone.now().date()
-
-        # Informations principales selon le cahier des charges
-        context.update(
-            {
-                "student": student,
-                "hours_remaining": student.hours_remaining,
-                "total_hours_purchased": student.total_hours_purchased,
-                "total_hours_used": student.computed_hours_used,
-                "languages": student.languages.all(),
-                "current_teachers": student.current_teachers.all(),
-            }
-        )
-
-        # Planning personnel (séances à venir)
-        upcoming_sessions = Session.objects.filter(
-            students=student, date__gte=today, status="scheduled"
-        ).order_by("date", "start_time")
-        context["upcoming_sessions"] = upcoming_sessions
-
-        # Historique des séances (faites / reportées)
-        completed_sessions = Session.objects.filter(
-            students=student, status="completed"
-        ).order_by("-date")[:10]
-        context["completed_sessions"] = completed_sessions
-
-        rescheduled_sessions = Session.objects.filter(
-            students=student, status="rescheduled"
-        ).order_by("-date")[:5]
-        context["rescheduled_sessions"] = rescheduled_sessions
+        # Compteurs, heures et listes de séances (requêtes agrégées)
+        context.update(get_student_dashboard_data(student, today=today))
 
         # Séances : passées les plus récentes d'abord, futures les plus proches ensuite
         sessions_page_num = request.GET.get('sessions_page', 1)
         base_qs = Session.objects.filter(students=student).select_related('language', 'teacher__user')
-        past_sessions = list(base_qs.filter(date__lte=today).order_by('-date', '-start_time'))
-        future_sessions = list(base_qs.filter(date__gt=today).order_by('date', 'start_time'))
-        all_sessions = past_sessions + future_sessions
-        sessions_paginator = Paginator(all_sessions, 8)
+        sessions_paginator = Paginator(PastThenFutureSessions(base_qs, today), 8)
         context["recent_sessions"] = sessions_paginator.get_page(sessions_page_num)
 
-        # Séances du jour
-        today_sessions = Session.objects.filter(students=student, date=today).order_by(
-            "start_time"
-        )
-        context["today_sessions"] = today_sessions
-
         # Notifications non lues
         unread_notifications = Notification.objects.filter(
             user=request.user, is_read=False
@@ -154,23 +125,6 @@ def dashboard_view(request, username=None):
         )[:5]
         context["recent_evaluations"] = recent_evaluations
 
-        # Statistiques de progression
-        total_sessions = Session.objects.filter(students=student).count()
-        completed_count = Session.objects.filter(
-            students=student, status="completed"
-        ).count()
-        
-
-        context.update(
-            {
-                "total_sessions": total_sessions,
-                "completed_sessions_count": completed_count,
-                # Tailwind dashboard variables
-                "completed_sessions": completed_count,
-                "hours_remaining": student.hours_remaining,
-            }
-        )
-
         return render(request, "dashboard/student/home/index.html", context)
 
     except Exception as e:
@@ -195,6 +149,8 @@ def teacher_view(request, username=None):
 
         teacher = get_object_or_404(Teacher, user=requested_user)
         today = timezone.now().date()
+        languages = list(teacher.languages.all())
+        stats = get_teacher_dashboard_stats(teacher, languages, today=today)
 
         # Informations principales
         context = {
@@ -202,8 +158,8 @@ def teacher_view(request, username=None):
             "user": request.user,
             "username": username,
             "teacher": teacher,
-            "languages": teacher.languages.all(),
-            "total_students": Student.objects.filter(current_teachers=teacher).count(),
+            "languages": languages,
+            "total_students": stats["total_students"],
             "hourly_rate": teacher.hourly_rate,
            
         }
@@ -258,36 +214,7 @@ def teacher_view(request, username=None):
         context["rescheduled_sessions"] = rescheduled_sessions
 
         # Statistiques par langue
-        language_stats = []
-        for language in teacher.languages.all():
-            sessions_count = Session.objects.filter(
-                teacher=teacher, 
-                language=language
-            ).count()
-            completed_count = Session.objects.filter(
-                teacher=teacher, 
-                language=language, 
-                status="completed"
-            ).count()
-            students_count = Student.objects.filter(
-                current_teachers=teacher, 
-                languages=language
-            ).count()
-
-            language_stats.append(
-                {
-                    "language": language,
-                    "total_sessions": sessions_count,
-                    "completed_sessions": completed_count,
-                    "students_count": students_count,
-                    "completion_rate": (
-                        (completed_count / sessions_count * 100)
-                        if sessions_count > 0
-                        else 0
-                    ),
-                }
-            )
-        context["language_stats"] = language_stats
+        context["language_stats"] = stats["language_stats"]
 
         # Évaluations récentes
         recent_evaluations = Evaluation.objects.filter(
@@ -303,11 +230,9 @@ def teacher_view(request, username=None):
         context["unread_notifications"] = unread_notifications
 
         # Tailwind dashboard variables
-        context['sessions_today_count'] = Session.objects.filter(teacher=teacher, date=today).count()
-        context['sessions_week_count'] = Session.objects.filter(
-            teacher=teacher, date__gte=today, date__lte=today + timedelta(days=7)
-        ).count()
-        context['total_students_count'] = teacher.total_students
+        context['sessions_today_count'] = stats['sessions_today_count']
+        context['sessions_week_count'] = stats['sessions_week_count']
+        context['total_students_count'] = stats['total_students']
 
         return render(request, "dashboard/teacher/home/index.html", context)
 
@@ -335,7 +260,7 @@ def profile_view(request):
     }
 
     if user.role == "student":
-        student = get_object_or_404(Student, user=user)
+        student = get_object_or_404(Student.objects.with_hours(), user=user)
         total_sessions = Session.objects.filter(students=student, status='completed').count()
         avg_rating_val = Comment.objects.filter(
             teacher__in=student.current_teachers.all()
@@ -685,17 +610,18 @@ def requests_view(request):
             return redirect("requests_view")
 
         # Toutes les demandes de l'étudiant
-        requests = Request.objects.filter(student=student)
-        teachers = student.current_teachers.all()
+        requests = Request.objects.filter(student=student).select_related("teacher__user")
+        teachers = student.current_teachers.select_related("user")
+        stats = requests.stats()
         context.update(
             {
                 "teachers": teachers,
                 "student": student,
                 "requests": requests,
-                "total_requests": requests.count(),
-                "pending_requests": requests.filter(status="pending").count(),
-                "approved_requests": requests.filter(status="approved").count(),
-                "rejected_requests": requests.filter(status="rejected").count(),
+                "total_requests": stats["total"],
+                "pending_requests": stats["pending"],
+                "approved_requests": stats["approved"],
+                "rejected_requests": stats["rejected"],
             }
         )
 
@@ -704,18 +630,39 @@ def requests_view(request):
     # ----- for teachers (optional) -----
     elif user.role == "teacher":
         teacher = get_object_or_404(Teacher, user=user)
-        # Toutes les demandes des étudiants liés à cet enseignant
-        requests = Request.objects.filter(student__current_teachers=teacher)
-        total_request = requests.count() if requests else 0
+        # Demandes adressées à cet enseignant ou envoyées par ses étudiants
+        inbox = Request.objects.for_teacher(teacher)
+        stats = inbox.stats()
+
+        # Filtres appliqués en SQL, pagination par curseur (created_at, id)
+        filters = {}
+        status = request.GET.get("status")
+        if status in dict(Request.STATUS_CHOICES):
+            filters["status"] = status
+        request_type = request.GET.get("type")
+        if request_type in dict(Request.REQUEST_TYPES):
+            filters["request_type"] = request_type
+        requests = cursor_paginate(
+            inbox.filter(**filters).select_related("student__user", "teacher__user"),
+            after=request.GET.get("after"),
+            before=request.GET.get("before"),
+        )
         context.update(
             {
                 "teacher": teacher,
                 "requests": requests,
-                "total_requests": total_request,
-                "pending_requests": requests.filter(status="pending").count(),
-                "processing_requests": requests.filter(status="processing").count(),
-                "approved_requests": requests.filter(status="approved").count(),
-                "rejected_requests": requests.filter(status="rejected").count(),
+                "status_filter": filters.get("status", ""),
+                "type_filter": filters.get("request_type", ""),
+                "status_choices": Request.STATUS_CHOICES,
+                "type_choices": Request.REQUEST_TYPES,
+                "filter_query": urlencode(
+                    {"status": filters.get("status", ""), "type": filters.get("request_type", "")}
+                ),
+                "total_requests": stats["total"],
+                "pending_requests": stats["pending"],
+                "processing_requests": stats["processing"],
+                "approved_requests": stats["approved"],
+                "rejected_requests": stats["rejected"],
             }
         )
 
@@ -744,9 +691,7 @@ def update_request_status(request):
 
         # Récupérer la demande — autorisé si la demande est envoyée à ce prof
         # OU si l'étudiant fait partie de ses élèves (cohérent avec la liste)
-        req = Request.objects.filter(id=request_id).filter(
-            Q(teacher=teacher) | Q(student__current_teachers=teacher)
-        ).distinct().first()
+        req = Request.objects.for_teacher(teacher).filter(id=request_id).first()
         if req is None:
             raise Request.DoesNotExist
         
@@ -769,17 +714,10 @@ def update_request_status(request):
             }, status=400)
         
         req.status = status_map[action]
-        req.save()
+        req.save(update_fields=['status', 'updated_at'])
         
-        # Récupérer les nouvelles statistiques
-        teacher_requests = Request.objects.filter(teacher=teacher)
-        stats = {
-            'total': teacher_requests.count(),
-            'pending': teacher_requests.filter(status='pending').count(),
-            'processing': teacher_requests.filter(status='processing').count(),
-            'approved': teacher_requests.filter(status='approved').count(),
-            'rejected': teacher_requests.filter(status='rejected').count(),
-        }
+        # Nouvelles statistiques, sur le même périmètre que la liste
+        stats = Request.objects.for_teacher(teacher).stats()
         
         return JsonResponse({
             'success': True,
@@ -1172,7 +1110,7 @@ def teacher_student_detail(request, student_id):
 
     # Vérifie que l'étudiant appartient bien à cet enseignant
     student = get_object_or_404(
-        Student.objects.filter(current_teachers=teacher), id=student_id
+        Student.objects.with_hours().filter(current_teachers=teacher), id=student_id
     )
 
     # Récupération des données associées
@@ -1254,7 +1192,7 @@ def export_students_csv(request):
     teacher = get_object_or_404(Teacher, user=request.user)
 
     # CORRECTION 1 : current_teachers au lieu de current_teacher
-    students = Student.objects.filter(current_teachers=teacher)
+    students = Student.objects.with_hours().filter(current_teachers=teacher)
 
     # Application des mêmes filtres que la vue principale
     langue_id = request.GET.get("langue")
@@ -1489,13 +1427,13 @@ def session_status_update(request, session_id):
             session.save()
 
             # Créer une notification pour tous les étudiants
-            for student in session.students.all():
-                Notification.objects.create(
-                    user=student.user,
-                    notification_type='evaluation_request',
-                    title="Votre cours est terminé — donnez votre avis",
-                    message=f"Votre séance de {session.language} avec {session.teacher} du {session.date} est terminée. Cliquez pour évaluer.",
-                )
+            notify(
+                session.students.values_list('user_id', flat=True),
+                notification_type='evaluation_request',
+                title="Votre cours est terminé — donnez votre avis",
+                message=f"Votre séance de {session.language} avec {session.teacher} du {session.date} est terminée. Cliquez pour évaluer.",
+                session=session,
+            )
 
             return JsonResponse(
                 {"success": True, "message": "Statut mis à jour avec succès"}
@@ -1640,8 +1578,8 @@ def teacher_resources_add_student(request):
                 resource.languages.add(language)
 
             # Créer une notification pour l'étudiant
-            Notification.objects.create(
-                user=student.user,
+            notify(
+                [student.user_id],
                 notification_type="system",
                 title="Nouvelle ressource disponible",
                 message=f"Votre enseignant a ajouté une nouvelle ressource: {title}",
@@ -1720,18 +1658,18 @@ def evaluations_view(request):
 
 @login_required
 def notifications_view(request):
-    notifications = Notification.objects.filter(user=request.user).order_by(
-        "-created_at"
+    notifications = cursor_paginate(
+        Notification.objects.filter(user=request.user),
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
     )
     profile = get_object_or_404(Profile, user=request.user)
     notification_id = request.POST.get("notification_id")
 
     # check if notification_id is provided to mark as read
-    if notification_id:
-        notification = Notification.objects.get(id=notification_id, user=request.user)
-        notification.is_read = True
-        notification.save()
-        return JsonResponse({"success": True})
+    if notification_id and notification_id.isdigit():
+        count = apply_bulk_action(request.user.pk, "read", ids=[int(notification_id)])
+        return JsonResponse({"success": True, "count": count})
 
     context = {"notifications": notifications, "user": request.user, "profile": profile}
 
@@ -1745,10 +1683,8 @@ def notifications_view(request):
 @login_required
 def notifications_mark_all_read(request):
     if request.method == "POST":
-        Notification.objects.filter(user=request.user, is_read=False).update(
-            is_read=True
-        )
-        return JsonResponse({"success": True})
+        count = apply_bulk_action(request.user.pk, "read")
+        return JsonResponse({"success": True, "count": count})
     return JsonResponse({"success": False, "error": "Méthode non autorisée"})
 
 
@@ -1756,12 +1692,9 @@ def notifications_mark_all_read(request):
 def delete_notification(request):
     notification_id = request.POST.get("notification_id")
 
-    # check if notification_id is provided to mark as read
-    if notification_id:
-        notification = Notification.objects.get(id=notification_id, user=request.user)
-        notification.is_read = True
-        notification.delete()
-        return JsonResponse({"success": True})
+    if notification_id and notification_id.isdigit():
+        count = apply_bulk_action(request.user.pk, "delete", ids=[int(notification_id)])
+        return JsonResponse({"success": True, "count": count})
     return JsonResponse({"success": False, "error": "ID de notification manquant"})
 
 
@@ -1771,7 +1704,7 @@ def payments_view(request):
     if request.user.role != "student":
         raise Http404("Cette page est réservée aux étudiants")
 
-    student = get_object_or_404(Student, user=request.user)
+    student = get_object_or_404(Student.objects.with_hours(), user=request.user)
     payments = Payment.objects.filter(student=student)
     total_paid = (
         payments.filter(status="paid").aggregate(total=Sum("amount"))["total"] or 0
@@ -1965,22 +1898,13 @@ def teacher_session_status_update(request, session_id):
         f"est maintenant marquée « {label} »."
     )
 
-    admin_users = CustomUser.objects.filter(role='admin')
-    for admin in admin_users:
-        Notification.objects.create(
-            user=admin,
-            notification_type='system',
-            title=title,
-            message=body,
-        )
-
-    for student in session.students.all():
-        Notification.objects.create(
-            user=student.user,
-            notification_type='system',
-            title=title,
-            message=body,
-        )
+    # Administrateurs + étudiants de la séance : une lecture, un INSERT
+    recipients = (
+        CustomUser.objects.filter(Q(role='admin') | Q(student__sessions=session))
+        .values_list('pk', flat=True)
+        .distinct()
+    )
+    notify(recipients, notification_type='system', title=title, message=body)
 
     messages.success(request, f"Statut mis à jour : {label}.")
     return redirect('teacher_sessions')
@@ -2043,10 +1967,12 @@ def test_template_tags(request):
 
 
 
+ADMIN_CHART_MONTHS = (6, 12, 24, 36)
+
+
 @admin_required
 def admin_dashboard(request):
     import json as _json
-    from datetime import date as _date
     # Statistiques principales
     total_teachers = Teacher.objects.count()
     total_students = Student.objects.count()
@@ -2123,47 +2049,22 @@ def admin_dashboard(request):
         total=Sum('amount'))['total'] or 0
     sessions_page_num = request.GET.get('sessions_page', 1)
     base_qs = Session.objects.select_related('teacher__user', 'language')
-    past_sessions = list(base_qs.filter(date__lte=today).order_by('-date', '-start_time'))
-    future_sessions = list(base_qs.filter(date__gt=today).order_by('date', 'start_time'))
-    sessions_paginator = Paginator(past_sessions + future_sessions, 8)
+    sessions_paginator = Paginator(PastThenFutureSessions(base_qs, today), 8)
     recent_sessions = sessions_paginator.get_page(sessions_page_num)
 
-    # ── Graphes : séances sur 6 mois ─────────────────────────────
-    labels = []
-    completed_data = []
-    scheduled_data = []
-    revenue_data = []
-    new_students_data = []
-    for i in range(5, -1, -1):
-        ref = today.replace(day=1)
-        # rewind i months
-        m = ref.month - i
-        y = ref.year
-        while m <= 0:
-            m += 12
-            y -= 1
-        first_day = _date(y, m, 1)
-        # last day of month
-        if m == 12:
-            last_day = _date(y + 1, 1, 1)
-        else:
-            last_day = _date(y, m + 1, 1)
-        labels.append(first_day.strftime('%b %Y'))
-        completed_data.append(
-            Session.objects.filter(status='completed', date__gte=first_day, date__lt=last_day).count()
-        )
-        scheduled_data.append(
-            Session.objects.filter(status='scheduled', date__gte=first_day, date__lt=last_day).count()
-        )
-        rev = Payment.objects.filter(
-            status='paid', payment_date__date__gte=first_day, payment_date__date__lt=last_day
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        revenue_data.append(float(rev))
-
-        ns = Student.objects.filter(
-            date_joined__gte=first_day, date_joined__lt=last_day
-        ).count()
-        new_students_data.append(ns)
+    # ── Graphes : séances sur N mois (table MonthlyRollup) ───────
+    try:
+        chart_months = int(request.GET.get('mois', 6))
+    except ValueError:
+        chart_months = 6
+    if chart_months not in ADMIN_CHART_MONTHS:
+        chart_months = 6
+    rollups = get_monthly_rollups(add_months(today.replace(day=1), 1 - chart_months), chart_months)
+    labels = [r.month.strftime('%b %Y') for r in rollups]
+    completed_data = [r.sessions_completed for r in rollups]
+    scheduled_data = [r.sessions_scheduled for r in rollups]
+    revenue_data = [float(r.revenue) for r in rollups]
+    new_students_data = [r.new_students for r in rollups]
 
     marge_nette = float(revenue_total) - float(total_paiements_formateurs)
 
@@ -2246,7 +2147,7 @@ def teacher_detail_view(request, teacher_id):
     ), id=teacher_id)
     
     # Statistiques de l'enseignant
-    students = teacher.current_students.all().annotate(
+    students = teacher.current_students.with_hours().annotate(
         total_payments=Sum('payments__amount'),
         total_hours_remaining=Sum('payments__hours_remaining')
     )
@@ -2266,7 +2167,7 @@ def teacher_detail_view(request, teacher_id):
 @admin_required
 def admin_student_view(request):
     # Liste de tous les étudiants avec statistiques
-    students = Student.objects.select_related('user').prefetch_related(
+    students = Student.objects.with_hours().select_related('user').prefetch_related(
         'current_teachers__user',
         'payments',
         'sessions'
@@ -2315,7 +2216,7 @@ def admin_student_view(request):
 @admin_required
 def student_detail_view(request, student_id):
     # Détails d'un étudiant spécifique
-    student = get_object_or_404(Student.objects.select_related('user').prefetch_related(
+    student = get_object_or_404(Student.objects.with_hours().select_related('user').prefetch_related(
         'current_teachers__user',
         'payments',
         'sessions__teacher__user',
@@ -2490,62 +2391,10 @@ def _parse_date_range(request, default_days=14):
 def admin_reporting_list(request):
     date_debut, date_fin = _parse_date_range(request)
 
-    all_sessions = Session.objects.filter(
-        date__gte=date_debut,
-        date__lte=date_fin,
-        seance_realisee=True,
-    )
-
-    teachers_stats = []
-    for t in Teacher.objects.all().select_related('user'):
-        t_sessions = all_sessions.filter(teacher=t)
-        nb = t_sessions.count()
-        if nb == 0:
-            continue
-        nb_validees = t_sessions.filter(statut_validation='validee').count()
-        student_ids = t_sessions.values_list('students', flat=True).distinct()
-        nb_students = student_ids.count()
-
-        student_avgs = (
-            t_sessions.filter(students__in=student_ids)
-            .values('students')
-            .annotate(
-                avg_p=Avg('participation'),
-                avg_c=Avg('comprehension_score'),
-                avg_e=Avg('engagement'),
-            )
-        )
-        nb_en_difficulte = sum(
-            1 for row in student_avgs
-            if (row['avg_p'] or 0) + (row['avg_c'] or 0) + (row['avg_e'] or 0) > 0
-            and ((row['avg_p'] or 0) + (row['avg_c'] or 0) + (row['avg_e'] or 0)) / 3 < 2.5
-        )
-
-        comp_counts = {
-            'Oral': t_sessions.filter(comp_oral=True).count(),
-            'Compréhension': t_sessions.filter(comp_comprehension=True).count(),
-            'Écrit': t_sessions.filter(comp_ecrit=True).count(),
-            'Grammaire': t_sessions.filter(comp_grammaire=True).count(),
-            'Vocabulaire': t_sessions.filter(comp_vocabulaire=True).count(),
-        }
-        top_comp = max(comp_counts, key=comp_counts.get) if any(comp_counts.values()) else None
-
-        teachers_stats.append({
-            'teacher': t,
-            'nb_sessions': nb,
-            'nb_sessions_validees': nb_validees,
-            'nb_students': nb_students,
-            'nb_en_difficulte': nb_en_difficulte,
-            'top_comp_faible': top_comp,
-        })
-
     return render(request, 'dashboard/admin/home/reporting.html', {
         'date_debut': date_debut,
         'date_fin': date_fin,
-        'teachers_stats': teachers_stats,
-        'total_sessions_global': sum(s['nb_sessions'] for s in teachers_stats),
-        'total_teachers_actifs': len(teachers_stats),
-        'total_students_global': all_sessions.values_list('students', flat=True).distinct().count(),
+        **reporting.teachers_report(date_debut, date_fin),
     })
 
 
@@ -2556,59 +2405,11 @@ def admin_reporting_detail(request, teacher_id):
 
     date_debut, date_fin = _parse_date_range(request)
 
-    sessions_qs = Session.objects.filter(
-        teacher=teacher,
-        date__gte=date_debut,
-        date__lte=date_fin,
-        seance_realisee=True,
-    )
-
-    total_sessions = sessions_qs.count()
-    sessions_validees = sessions_qs.filter(statut_validation='validee').count()
-    student_ids = sessions_qs.values_list('students', flat=True).distinct()
-    students = Student.objects.filter(id__in=student_ids).select_related('user')
-
-    student_stats = []
-    students_en_difficulte = []
-    for s in students:
-        s_sessions = sessions_qs.filter(students=s)
-        avg_participation = s_sessions.aggregate(Avg('participation'))['participation__avg']
-        avg_comprehension = s_sessions.aggregate(Avg('comprehension_score'))['comprehension_score__avg']
-        avg_engagement = s_sessions.aggregate(Avg('engagement'))['engagement__avg']
-        stat = {
-            'student': s,
-            'nb_sessions': s_sessions.count(),
-            'avg_participation': round(avg_participation, 1) if avg_participation else None,
-            'avg_comprehension': round(avg_comprehension, 1) if avg_comprehension else None,
-            'avg_engagement': round(avg_engagement, 1) if avg_engagement else None,
-        }
-        student_stats.append(stat)
-        score = (avg_participation or 0) + (avg_comprehension or 0) + (avg_engagement or 0)
-        if score > 0 and score / 3 < 2.5:
-            students_en_difficulte.append(s)
-
-    comp_faibles = {
-        'Oral': sessions_qs.filter(comp_oral=True).count(),
-        'Compréhension': sessions_qs.filter(comp_comprehension=True).count(),
-        'Écrit': sessions_qs.filter(comp_ecrit=True).count(),
-        'Grammaire': sessions_qs.filter(comp_grammaire=True).count(),
-        'Vocabulaire': sessions_qs.filter(comp_vocabulaire=True).count(),
-    }
-
-    sessions_list = sessions_qs.select_related(
-        'teacher__user', 'language'
-    ).prefetch_related('students__user').order_by('-date', '-start_time')
-
     return render(request, 'dashboard/admin/home/reporting_detail.html', {
         'teacher': teacher,
         'date_debut': date_debut,
         'date_fin': date_fin,
-        'total_sessions': total_sessions,
-        'sessions_validees': sessions_validees,
-        'student_stats': student_stats,
-        'students_en_difficulte': students_en_difficulte,
-        'comp_faibles': comp_faibles,
-        'sessions_list': sessions_list,
+        **reporting.teacher_report(teacher, date_debut, date_fin),
     })
 
 
@@ -2619,59 +2420,11 @@ def teacher_reporting(request):
 
     date_debut, date_fin = _parse_date_range(request)
 
-    sessions_qs = Session.objects.filter(
-        teacher=teacher,
-        date__gte=date_debut,
-        date__lte=date_fin,
-        seance_realisee=True,
-    )
-
-    total_sessions = sessions_qs.count()
-    sessions_validees = sessions_qs.filter(statut_validation='validee').count()
-    student_ids = sessions_qs.values_list('students', flat=True).distinct()
-    students = Student.objects.filter(id__in=student_ids).select_related('user')
-
-    student_stats = []
-    students_en_difficulte = []
-    for s in students:
-        s_sessions = sessions_qs.filter(students=s)
-        avg_participation = s_sessions.aggregate(Avg('participation'))['participation__avg']
-        avg_comprehension = s_sessions.aggregate(Avg('comprehension_score'))['comprehension_score__avg']
-        avg_engagement = s_sessions.aggregate(Avg('engagement'))['engagement__avg']
-        stat = {
-            'student': s,
-            'nb_sessions': s_sessions.count(),
-            'avg_participation': round(avg_participation, 1) if avg_participation else None,
-            'avg_comprehension': round(avg_comprehension, 1) if avg_comprehension else None,
-            'avg_engagement': round(avg_engagement, 1) if avg_engagement else None,
-        }
-        student_stats.append(stat)
-        score = (avg_participation or 0) + (avg_comprehension or 0) + (avg_engagement or 0)
-        if score > 0 and score / 3 < 2.5:
-            students_en_difficulte.append(s)
-
-    comp_faibles = {
-        'Oral': sessions_qs.filter(comp_oral=True).count(),
-        'Compréhension': sessions_qs.filter(comp_comprehension=True).count(),
-        'Écrit': sessions_qs.filter(comp_ecrit=True).count(),
-        'Grammaire': sessions_qs.filter(comp_grammaire=True).count(),
-        'Vocabulaire': sessions_qs.filter(comp_vocabulaire=True).count(),
-    }
-
-    sessions_list = sessions_qs.select_related(
-        'teacher__user', 'language'
-    ).prefetch_related('students__user').order_by('-date', '-start_time')
-
     return render(request, 'dashboard/teacher/home/reporting.html', {
         'teacher': teacher,
         'date_debut': date_debut,
         'date_fin': date_fin,
-        'total_sessions': total_sessions,
-        'sessions_validees': sessions_validees,
-        'student_stats': student_stats,
-        'students_en_difficulte': students_en_difficulte,
-        'comp_faibles': comp_faibles,
-        'sessions_list': sessions_list,
+        **reporting.teacher_report(teacher, date_debut, date_fin),
     })
 
 
@@ -3606,11 +3359,12 @@ def admin_request_delete(request, req_id):
 
 @admin_required
 def admin_notifications_list(request):
-    notifs = Notification.objects.select_related('user').order_by('-created_at')
-    paginator = Paginator(notifs, 25)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    notifications = cursor_paginate(
+        Notification.objects.select_related('user'),
+        after=request.GET.get('after'), before=request.GET.get('before'), per_page=25,
+    )
     return render(request, 'dashboard/admin/home/notifications_list.html', {
-        'notifs': page_obj, 'section_active': 'notifications',
+        'notifications': notifications, 'section_active': 'notifications',
     })
 
 